@@ -0,0 +1,3 @@
+from registhor_app.asgi import create_asgi_app
+
+application = app = create_asgi_app()
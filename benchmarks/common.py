@@ -0,0 +1,79 @@
+"""Requests and reporting shared by 'benchmarks.routes' and
+'benchmarks.load_test'.
+"""
+import datetime
+import json
+import math
+
+# 'benchmarks.seed' starts offerings up to two years before and one year
+# after the day it's run; query the past year so date-range routes return rows
+DATE_2 = datetime.date.today()
+DATE_1 = DATE_2 - datetime.timedelta(days=365)
+
+# (name, path) of a representative GET request to every route; codes match
+# the data generated by 'benchmarks.seed'. Query strings omit 'key'.
+ROUTES = [
+	('comments/course-codes', '/api/v1/comments/course-codes/general?department_code=D001'),
+	('comments/counts', '/api/v1/comments/counts/general?department_code=D001'),
+	('comments/text', '/api/v1/comments/text/general?department_code=D001&limit=100'),
+	('comments/search', '/api/v1/comments/search/general?q=useful%20examples&department_code=D001&limit=100'),
+	('departments/mandatory-courses', '/api/v1/departments/mandatory-courses?department_code=D001'),
+	('departments/mandatory-courses-batch', '/api/v1/departments/mandatory-courses/batch?department_codes={0}'.format(
+		','.join('D{0:03d}'.format(i) for i in range(50)))),
+	('evalhalla/cities', '/api/v1/evalhalla/cities'),
+	('evalhalla/classifications', '/api/v1/evalhalla/classifications'),
+	('evalhalla/departments', '/api/v1/evalhalla/departments'),
+	('offerings/offering-information', '/api/v1/offerings/offering-information?date_1={0}&date_2={1}'.format(DATE_1, DATE_2)),
+	('offerings/counts-by-city', '/api/v1/offerings/counts-by-city?date_1={0}&date_2={1}'.format(DATE_1, DATE_2)),
+	('offerings/instructors', '/api/v1/offerings/instructors?q=instructor%201'),
+	('registrations/course-codes', '/api/v1/registrations/course-codes'),
+	('registrations/department-codes', '/api/v1/registrations/department-codes'),
+	('registrations/training-locations', '/api/v1/registrations/training-locations?department_code=D001'),
+	('registrations/training-locations-batch', '/api/v1/registrations/training-locations/batch?department_codes={0}'.format(
+		','.join('D{0:03d}'.format(i) for i in range(50)))),
+	('tombstone/all', '/api/v1/tombstone/C001'),
+	('tombstone/attr', '/api/v1/tombstone/C001/duration'),
+	('tombstone/batch', '/api/v1/tombstone/batch?course_codes={0}&attrs=duration,provider'.format(
+		','.join('C{0:03d}'.format(i) for i in range(150)))),
+	('status/db-pool', '/api/v1/status/db-pool'),
+	('status/cache', '/api/v1/status/cache')
+]
+
+
+def with_key(path, key):
+	"""Append API key to a path from ROUTES."""
+	return '{0}{1}key={2}'.format(path, '&' if '?' in path else '?', key)
+
+
+def count_rows(body):
+	"""Return number of rows in a JSON response body: length of 'results'
+	if a list or dict, else 1.
+	"""
+	try:
+		results = json.loads(body).get('results', None)
+	except (ValueError, AttributeError):
+		return 0
+	return len(results) if isinstance(results, (list, dict)) else 1
+
+
+def percentile(sorted_values, p):
+	"""Return p-th percentile (0-100) of sorted values by nearest rank."""
+	if not sorted_values:
+		return float('nan')
+	rank = max(math.ceil(p / 100 * len(sorted_values)), 1)
+	return sorted_values[rank - 1]
+
+
+def summarize(name, latencies, n_rows, elapsed, errors=0):
+	"""Return a report line for one route. 'latencies' are in seconds;
+	'elapsed' is wall time taken by all requests.
+	"""
+	latencies = sorted(latencies)
+	ms = [percentile(latencies, p) * 1000 for p in (50, 95, 99)]
+	return '{0:<34} {1:>6} {2:>9.1f} {3:>9.1f} {4:>9.1f} {5:>9.1f} {6:>12,.0f} {7:>6}'.format(
+		name, len(latencies), ms[0], ms[1], ms[2], len(latencies) / elapsed if elapsed else 0,
+		n_rows / elapsed if elapsed else 0, errors)
+
+
+HEADER = '{0:<34} {1:>6} {2:>9} {3:>9} {4:>9} {5:>9} {6:>12} {7:>6}'.format(
+	'route', 'n', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s', 'rows/s', 'errors')
@@ -0,0 +1,84 @@
+"""Concurrent HTTP load generator for a running instance of the API, e.g.
+gunicorn serving 'application:app' against a database filled by
+'benchmarks.seed'. Each client thread sends requests back to back, cycling
+through the routes, for the given duration. Reports latency percentiles,
+requests/sec and rows/sec per route and overall, for sizing worker
+counts. Run from the repo root:
+
+	python -m benchmarks.load_test http://localhost:8000 [--concurrency 16] [--duration 30]
+
+Uses only the standard library so it can run from any machine.
+"""
+import argparse
+import itertools
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from benchmarks.common import HEADER, ROUTES, count_rows, summarize, with_key
+
+
+def _client(base_url, routes, key, deadline, results, lock, offset):
+	"""Send requests until deadline, recording (latency, rows, ok) per route."""
+	local = defaultdict(list)
+	# Stagger starting route so threads don't all hit the same one at once
+	for name, path in itertools.islice(itertools.cycle(routes), offset, None):
+		if time.monotonic() >= deadline:
+			break
+		request = urllib.request.Request(base_url + with_key(path, key), headers={'Accept-Encoding': 'identity'})
+		start = time.perf_counter()
+		try:
+			with urllib.request.urlopen(request, timeout=60) as response:
+				body = response.read()
+			local[name].append((time.perf_counter() - start, count_rows(body), True))
+		except (urllib.error.URLError, OSError):
+			local[name].append((time.perf_counter() - start, 0, False))
+	with lock:
+		for name, samples in local.items():
+			results[name].extend(samples)
+
+
+def run(base_url, concurrency=16, duration=30, key=None, names=None):
+	key = key or os.environ.get('REGISTHOR_API_KEY', 'benchmark')
+	routes = [(name, path) for name, path in ROUTES if not names or name in names]
+	results = defaultdict(list)
+	lock = threading.Lock()
+	deadline = time.monotonic() + duration
+	threads = [threading.Thread(target=_client, args=(base_url.rstrip('/'), routes, key, deadline, results, lock, i))
+			   for i in range(concurrency)]
+	start = time.perf_counter()
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	elapsed = time.perf_counter() - start
+
+	print('{0} clients for {1:.1f}s against {2}'.format(concurrency, elapsed, base_url))
+	print(HEADER)
+	all_samples = []
+	for name, _ in routes:
+		samples = results.get(name, [])
+		all_samples.extend(samples)
+		ok = [sample for sample in samples if sample[2]]
+		print(summarize(name, [sample[0] for sample in ok], sum(sample[1] for sample in ok),
+						elapsed, len(samples) - len(ok)))
+	ok = [sample for sample in all_samples if sample[2]]
+	print(summarize('TOTAL', [sample[0] for sample in ok], sum(sample[1] for sample in ok),
+					elapsed, len(all_samples) - len(ok)))
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('base_url')
+	parser.add_argument('--concurrency', type=int, default=16, help='number of client threads')
+	parser.add_argument('--duration', type=float, default=30, help='seconds to run for')
+	parser.add_argument('--key', help='API key; defaults to REGISTHOR_API_KEY')
+	parser.add_argument('--route', action='append', help='only request named route; may be repeated')
+	args = parser.parse_args()
+	run(args.base_url, args.concurrency, args.duration, args.key, args.route)
+
+
+if __name__ == '__main__':
+	main()
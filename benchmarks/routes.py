@@ -0,0 +1,74 @@
+"""Benchmark every route in-process through the Flask test client against a
+database filled by 'benchmarks.seed', reporting latency percentiles and
+rows/sec per route. Excludes network and WSGI server overhead; see
+'benchmarks.load_test' for those. Run from the repo root:
+
+	python -m benchmarks.routes [--database registhor_bench] [--requests 200]
+
+Routes not registered in the app are skipped. Latencies are of 200
+responses only; other responses are counted under 'errors' and their
+status codes listed after the route's line.
+"""
+import argparse
+import os
+import time
+from collections import Counter
+from werkzeug.exceptions import NotFound
+from benchmarks.common import HEADER, ROUTES, count_rows, summarize, with_key
+
+
+def run(database, n_requests=200, warmup=5, names=None):
+	# App reads connection settings when it connects so point it at the
+	# benchmark database before creating it
+	os.environ['DB_DATABASE_NAME'] = database
+	os.environ.setdefault('REGISTHOR_API_KEY', 'benchmark')
+	from registhor_app import create_app
+	app = create_app()
+	client = app.test_client()
+	adapter = app.url_map.bind('localhost')
+	key = os.environ['REGISTHOR_API_KEY']
+
+	print(HEADER)
+	for name, path in ROUTES:
+		if names and name not in names:
+			continue
+		try:
+			adapter.match(path.split('?')[0])
+		except NotFound:
+			print('{0:<34} skipped (route not registered)'.format(name))
+			continue
+		url = with_key(path, key)
+		# Warm up pool, caches and snapshots so they don't skew percentiles
+		for _ in range(warmup):
+			client.get(url)
+		latencies, n_rows, errors = [], 0, Counter()
+		start = time.perf_counter()
+		for _ in range(n_requests):
+			t = time.perf_counter()
+			response = client.get(url)
+			body = response.get_data()
+			elapsed = time.perf_counter() - t
+			# Keep failed requests out of the percentiles
+			if response.status_code != 200:
+				errors[response.status_code] += 1
+			else:
+				latencies.append(elapsed)
+				n_rows += count_rows(body)
+		print(summarize(name, latencies, n_rows, time.perf_counter() - start, sum(errors.values())))
+		if errors:
+			print('{0:<34} status codes: {1}'.format('', ', '.join(
+				'{0} x{1}'.format(status, n) for status, n in sorted(errors.items()))))
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--database', default='registhor_bench')
+	parser.add_argument('--requests', type=int, default=200, help='requests per route')
+	parser.add_argument('--warmup', type=int, default=5, help='untimed requests per route')
+	parser.add_argument('--route', action='append', help='only benchmark named route; may be repeated')
+	args = parser.parse_args()
+	run(args.database, args.requests, args.warmup, args.route)
+
+
+if __name__ == '__main__':
+	main()
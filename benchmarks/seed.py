@@ -0,0 +1,292 @@
+"""Create and fill a MySQL or MariaDB database with synthetic versions of
+every table the API reads, for use by 'benchmarks.routes' and
+'benchmarks.load_test'. Connects with DB_HOST, DB_USER and DB_PASSWORD as
+the app does. Run from the repo root:
+
+	python -m benchmarks.seed [--database registhor_bench] [--scale 1]
+
+Existing tables in the target database are dropped, so it refuses to seed
+the database named in DB_DATABASE_NAME unless passed --force.
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+import mysql.connector
+
+# Rows per table at scale 1; 'product_info' and 'departments' don't scale as
+# the real tables are small and fixed in size
+BASE_ROWS = {
+	'offerings': 5000,
+	'lsr_this_year': 50000,
+	'lsr_last_year': 50000,
+	'comments': 20000
+}
+N_COURSES = 500
+N_DEPARTMENTS = 150
+INSERT_BATCH_SIZE = 1000
+
+# (name, lat, lng) in EN and FR; clustered around a few centres so map
+# routes have nearby markers to combine
+CITIES = [
+	('Ottawa', 'Ottawa', 45.4215, -75.6972),
+	('Gatineau', 'Gatineau', 45.4765, -75.7013),
+	('Kanata', 'Kanata', 45.3088, -75.8987),
+	('Toronto', 'Toronto', 43.6532, -79.3832),
+	('Mississauga', 'Mississauga', 43.5890, -79.6441),
+	('Montreal', 'Montréal', 45.5017, -73.5673),
+	('Quebec City', 'Québec', 46.8139, -71.2080),
+	('Halifax', 'Halifax', 44.6488, -63.5752),
+	('Winnipeg', 'Winnipeg', 49.8951, -97.1384),
+	('Vancouver', 'Vancouver', 49.2827, -123.1207),
+	('Online', 'En ligne', None, None)
+]
+STATUSES = ['Cancelled - Normal', 'Delivered - Normal', 'Open - Normal']
+REG_STATUSES = ['Confirmed', 'Confirmed', 'Confirmed', 'Cancelled', 'Waitlisted']
+# Only types with a French label in 'utils.BUSINESS_TYPE_MAP'
+BUSINESS_TYPES = ['Events', 'Instructor-Led']
+BUSINESS_LINES = [('Digital Academy', 'Académie du numérique'), ('Leadership', 'Leadership'),
+				  ('Public Service Management', 'Gestion de la fonction publique')]
+LANGUAGES = ['Bilingual', 'English', 'French']
+CLASSIFS = ['AS-02', 'CS-03', 'EC-05', 'EX-01', 'PM-04', 'Unknown']
+QUESTIONS = ['Comment - General', 'Comment - Improvement', 'Comment - Technical']
+WORDS = ['course', 'instructor', 'material', 'excellent', 'slow', 'useful', 'examples', 'online', 'room', 'pace']
+
+SCHEMA = [
+	"""
+	CREATE TABLE departments (
+		dept_code VARCHAR(32) NOT NULL PRIMARY KEY,
+		dept_name_en VARCHAR(255),
+		dept_name_fr VARCHAR(255)
+	)
+	""",
+	"""
+	CREATE TABLE product_info (
+		course_code VARCHAR(16) NOT NULL PRIMARY KEY,
+		course_description_en TEXT,
+		course_description_fr TEXT,
+		business_type_en VARCHAR(64),
+		business_type_fr VARCHAR(64),
+		provider_en VARCHAR(255),
+		provider_fr VARCHAR(255),
+		displayed_on_gccampus_en VARCHAR(8),
+		displayed_on_gccampus_fr VARCHAR(8),
+		duration VARCHAR(64),
+		main_topic_en VARCHAR(255),
+		main_topic_fr VARCHAR(255),
+		business_line_en VARCHAR(255),
+		business_line_fr VARCHAR(255),
+		required_training_en VARCHAR(255),
+		required_training_fr VARCHAR(255),
+		communities_en VARCHAR(255),
+		communities_fr VARCHAR(255),
+		point_of_contact VARCHAR(255),
+		director VARCHAR(255),
+		program_manager VARCHAR(255),
+		project_lead VARCHAR(255)
+	)
+	""",
+	"""
+	CREATE TABLE offerings (
+		offering_id INT NOT NULL PRIMARY KEY,
+		course_code VARCHAR(16),
+		course_title_en VARCHAR(255),
+		course_title_fr VARCHAR(255),
+		instructor_names VARCHAR(255),
+		confirmed_count INT,
+		cancelled_count INT,
+		waitlisted_count INT,
+		no_show_count INT,
+		business_type VARCHAR(64),
+		event_description VARCHAR(255),
+		start_date DATE,
+		end_date DATE,
+		client VARCHAR(32),
+		offering_status VARCHAR(32),
+		offering_language VARCHAR(16),
+		offering_region_en VARCHAR(64),
+		offering_region_fr VARCHAR(64),
+		offering_province_en VARCHAR(64),
+		offering_province_fr VARCHAR(64),
+		offering_city_en VARCHAR(64),
+		offering_city_fr VARCHAR(64),
+		offering_lat DECIMAL(9, 6),
+		offering_lng DECIMAL(9, 6),
+		INDEX (start_date, end_date),
+		INDEX (course_code)
+	)
+	""",
+	"""
+	CREATE TABLE {0} (
+		reg_id INT NOT NULL PRIMARY KEY,
+		course_code VARCHAR(16),
+		course_title_en VARCHAR(255),
+		course_title_fr VARCHAR(255),
+		reg_status VARCHAR(32),
+		billing_dept_code VARCHAR(32),
+		billing_dept_name_en VARCHAR(255),
+		billing_dept_name_fr VARCHAR(255),
+		learner_classif VARCHAR(16),
+		learner_city_en VARCHAR(64),
+		learner_city_fr VARCHAR(64),
+		learner_province_en VARCHAR(64),
+		learner_province_fr VARCHAR(64),
+		offering_city_en VARCHAR(64),
+		offering_city_fr VARCHAR(64),
+		offering_lat DECIMAL(9, 6),
+		offering_lng DECIMAL(9, 6),
+		INDEX (billing_dept_code, reg_status),
+		INDEX (course_code)
+	)
+	""",
+	"""
+	CREATE TABLE comments (
+		survey_id INT NOT NULL PRIMARY KEY,
+		short_question VARCHAR(64),
+		text_answer TEXT,
+		course_code VARCHAR(16),
+		learner_classif VARCHAR(16),
+		learner_dept_code VARCHAR(32),
+		offering_city_en VARCHAR(64),
+		offering_city_fr VARCHAR(64),
+		fiscal_year VARCHAR(16),
+		quarter VARCHAR(4),
+		overall_satisfaction INT,
+		stars INT,
+		magnitude FLOAT,
+		nanos INT,
+		INDEX (short_question, learner_dept_code, course_code, fiscal_year)
+	)
+	""",
+	"""
+	CREATE TABLE mandatory_courses (
+		dept_code VARCHAR(32) NOT NULL,
+		course_code VARCHAR(16) NOT NULL,
+		PRIMARY KEY (dept_code, course_code)
+	)
+	"""
+]
+TABLES = ['departments', 'product_info', 'offerings', 'lsr_this_year', 'lsr_last_year', 'comments', 'mandatory_courses']
+
+
+def course_code(i):
+	return 'C{0:03d}'.format(i % N_COURSES)
+
+
+def department_code(i):
+	return 'D{0:03d}'.format(i % N_DEPARTMENTS)
+
+
+def make_departments():
+	for i in range(N_DEPARTMENTS):
+		yield (department_code(i), 'Department {0}'.format(i), 'Ministère {0}'.format(i))
+
+
+def make_product_info(rng):
+	for i in range(N_COURSES):
+		business_line_en, business_line_fr = rng.choice(BUSINESS_LINES)
+		yield (course_code(i), 'Description of course {0}.'.format(i), 'Description du cours {0}.'.format(i),
+			   rng.choice(BUSINESS_TYPES), rng.choice(BUSINESS_TYPES), 'CSPS', 'EFPC', 'Yes', 'Oui',
+			   '{0} hours'.format(rng.randint(1, 40)), 'Topic {0}'.format(i % 20), 'Sujet {0}'.format(i % 20),
+			   business_line_en, business_line_fr, None, None, 'Community', 'Communauté',
+			   'Contact {0}'.format(i % 30), 'Director {0}'.format(i % 10), 'Manager {0}'.format(i % 25), None)
+
+
+def make_offerings(rng, n_rows):
+	today = datetime.date.today()
+	for i in range(n_rows):
+		city_en, city_fr, lat, lng = rng.choice(CITIES)
+		start_date = today + datetime.timedelta(days=rng.randint(-730, 365))
+		yield (i, course_code(rng.randrange(N_COURSES)), 'Course title', 'Titre du cours',
+			   'Instructor {0}'.format(rng.randrange(200)), rng.randint(0, 30), rng.randint(0, 5), rng.randint(0, 5),
+			   rng.randint(0, 3), rng.choice(BUSINESS_TYPES), None, start_date,
+			   start_date + datetime.timedelta(days=rng.randint(0, 4)),
+			   department_code(rng.randrange(N_DEPARTMENTS)) if rng.random() < 0.2 else '',
+			   rng.choice(STATUSES), rng.choice(LANGUAGES), 'Region', 'Région', 'Province', 'Province',
+			   city_en, city_fr, lat, lng)
+
+
+def make_registrations(rng, n_rows, first_id):
+	for i in range(first_id, first_id + n_rows):
+		city_en, city_fr, lat, lng = rng.choice(CITIES)
+		learner_city_en, learner_city_fr, _, _ = rng.choice(CITIES)
+		code = department_code(rng.randrange(N_DEPARTMENTS))
+		yield (i, course_code(rng.randrange(N_COURSES)), 'Course title', 'Titre du cours', rng.choice(REG_STATUSES),
+			   code, 'Department {0}'.format(code), 'Ministère {0}'.format(code), rng.choice(CLASSIFS),
+			   learner_city_en, learner_city_fr, 'Ontario', 'Ontario', city_en, city_fr, lat, lng)
+
+
+def make_comments(rng, n_rows):
+	for i in range(n_rows):
+		city_en, city_fr, _, _ = rng.choice(CITIES)
+		stars = rng.choice([None, 1, 2, 3, 4, 5])
+		yield (i, rng.choice(QUESTIONS), ' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 60))),
+			   course_code(rng.randrange(N_COURSES)), rng.choice(CLASSIFS), department_code(rng.randrange(N_DEPARTMENTS)),
+			   city_en, city_fr, '{0}-{1}'.format(2017 + i % 3, 18 + i % 3), 'Q{0}'.format(1 + i % 4),
+			   rng.randint(1, 10), stars, rng.random(), rng.randrange(10 ** 9))
+
+
+def insert_rows(cnx, table, rows):
+	"""Insert rows in batches; return number inserted."""
+	rows = iter(rows)
+	count = 0
+	cursor = cnx.cursor()
+	while True:
+		batch = [row for _, row in zip(range(INSERT_BATCH_SIZE), rows)]
+		if not batch:
+			break
+		statement = 'INSERT INTO {0} VALUES ({1});'.format(table, ', '.join(['%s'] * len(batch[0])))
+		cursor.executemany(statement, batch)
+		count += len(batch)
+	cnx.commit()
+	cursor.close()
+	return count
+
+
+def seed(database, scale=1.0, seed_=0):
+	rng = random.Random(seed_)
+	n_rows = {table: int(base * scale) for table, base in BASE_ROWS.items()}
+	cnx = mysql.connector.connect(host=os.environ.get('DB_HOST'),
+								  user=os.environ.get('DB_USER'),
+								  password=os.environ.get('DB_PASSWORD'))
+	cursor = cnx.cursor()
+	cursor.execute('CREATE DATABASE IF NOT EXISTS {0} CHARACTER SET utf8mb4;'.format(database))
+	cursor.execute('USE {0};'.format(database))
+	for table in TABLES:
+		cursor.execute('DROP TABLE IF EXISTS {0};'.format(table))
+	for statement in SCHEMA:
+		for table in ('lsr_this_year', 'lsr_last_year') if '{0}' in statement else (None,):
+			cursor.execute(statement.format(table))
+	cursor.close()
+
+	generators = [
+		('departments', make_departments()),
+		('product_info', make_product_info(rng)),
+		('offerings', make_offerings(rng, n_rows['offerings'])),
+		('lsr_this_year', make_registrations(rng, n_rows['lsr_this_year'], 0)),
+		('lsr_last_year', make_registrations(rng, n_rows['lsr_last_year'], n_rows['lsr_this_year'])),
+		('comments', make_comments(rng, n_rows['comments']))
+	]
+	for table, rows in generators:
+		start = time.perf_counter()
+		count = insert_rows(cnx, table, rows)
+		print('{0}: {1:,} rows in {2:.1f}s'.format(table, count, time.perf_counter() - start))
+	cnx.close()
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--database', default='registhor_bench')
+	parser.add_argument('--scale', type=float, default=1.0, help='multiplier of BASE_ROWS')
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--force', action='store_true', help='allow seeding the database in DB_DATABASE_NAME')
+	args = parser.parse_args()
+	if args.database == os.environ.get('DB_DATABASE_NAME') and not args.force:
+		sys.exit('Refusing to drop tables in DB_DATABASE_NAME; pass --force if this is intended.')
+	seed(args.database, args.scale, args.seed)
+
+
+if __name__ == '__main__':
+	main()
@@ -15,15 +15,52 @@ def create_app(config_class=Config):
 	from registhor_app import db
 	db.init_app(app)
 	
+	# Register query result cache
+	from registhor_app import cache
+	cache.init_app(app)
+	
+	# Register index of active course and department codes
+	from registhor_app import code_index
+	code_index.init_app(app)
+	
+	# Register rollups serving map endpoints
+	from registhor_app import rollups
+	rollups.init_app(app)
+	
+	# Register in-memory copy of product_info serving tombstone routes
+	from registhor_app import product_info
+	product_info.init_app(app)
+	
+	# Register interval index of offering dates
+	from registhor_app import interval_index
+	interval_index.init_app(app)
+	
+	# Register instructor name search index
+	from registhor_app import instructor_index
+	instructor_index.init_app(app)
+	
+	# Register full-text index of comments
+	from registhor_app import comment_index
+	comment_index.init_app(app)
+	
+	# Register request timing; before compression so that its after_request
+	# hook runs last and sees the compression time
+	from registhor_app import timing
+	timing.init_app(app)
+	
+	# Register response compression
+	from registhor_app import compression
+	compression.init_app(app)
+	
 	# Register blueprints
-	# from registhor_app.comments_routes.routes import comments
+	from registhor_app.comments_routes.routes import comments
 	from registhor_app.departments_routes.routes import departments
 	from registhor_app.evalhalla_routes.routes import evalhalla
 	from registhor_app.main_routes.routes import main
 	from registhor_app.offerings_routes.routes import offerings
 	from registhor_app.registrations_routes.routes import registrations
 	from registhor_app.tombstone_routes.routes import tombstone
-	# app.register_blueprint(comments)
+	app.register_blueprint(comments)
 	app.register_blueprint(departments)
 	app.register_blueprint(evalhalla)
 	app.register_blueprint(main)
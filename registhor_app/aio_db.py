@@ -0,0 +1,78 @@
+"""Async counterpart of 'db' for the ASGI entry point: a pool of aiomysql
+connections created on startup, so a request waiting on MySQL yields its
+event loop to other requests rather than blocking a worker thread.
+"""
+import asyncio
+import os
+import time
+from registhor_app.timing import log_slow_query, span
+
+# aiomysql is optional; only needed by the ASGI entry point
+try:
+	import aiomysql
+except ImportError:
+	aiomysql = None
+
+# Process-wide pool; created by 'init_pool' on ASGI startup
+_pool = None
+_timeout = None
+
+
+async def init_pool(config):
+	"""Open the pool sized as the sync pool is, from a Flask config mapping."""
+	global _pool, _timeout
+	if aiomysql is None:
+		raise RuntimeError('Package aiomysql is required to serve requests asynchronously.')
+	_pool = await aiomysql.create_pool(host=os.environ.get('DB_HOST'),
+									   user=os.environ.get('DB_USER'),
+									   password=os.environ.get('DB_PASSWORD'),
+									   db=os.environ.get('DB_DATABASE_NAME'),
+									   charset='utf8mb4',
+									   autocommit=True,
+									   minsize=0,
+									   maxsize=config['DB_POOL_SIZE'] + config['DB_POOL_MAX_OVERFLOW'],
+									   pool_recycle=config['DB_POOL_RECYCLE'])
+	_timeout = config['DB_POOL_TIMEOUT']
+
+
+async def close_pool():
+	"""Close all connections on ASGI shutdown."""
+	global _pool
+	if _pool is not None:
+		_pool.close()
+		await _pool.wait_closed()
+		_pool = None
+
+
+async def query_mysql(query, args=None, dict_=False):
+	"""Run query on a pooled connection, as 'db.query_mysql' does."""
+	if _pool is None:
+		raise RuntimeError('Async pool not initialized; call init_pool on startup.')
+	with span('connect'):
+		try:
+			cnx = await asyncio.wait_for(_pool.acquire(), _timeout)
+		except asyncio.TimeoutError:
+			raise TimeoutError('Timed out after {0}s waiting for a DB connection.'.format(_timeout))
+	try:
+		async with cnx.cursor(aiomysql.DictCursor if dict_ else aiomysql.Cursor) as cursor:
+			start = time.perf_counter()
+			with span('execute'):
+				await cursor.execute(query, args)
+			with span('fetch'):
+				results = await cursor.fetchall()
+			log_slow_query(query, args, time.perf_counter() - start)
+	finally:
+		_pool.release(cnx)
+	return results
+
+
+def pool_stats():
+	"""Return a snapshot of the pool's counters for monitoring."""
+	if _pool is None:
+		return {}
+	return {
+		'size': _pool.size,
+		'max_size': _pool.maxsize,
+		'idle': _pool.freesize,
+		'checked_out': _pool.size - _pool.freesize
+	}
@@ -0,0 +1,180 @@
+"""ASGI application serving the offering routes on an async MySQL pool.
+
+The offering calendar and map issue many concurrent requests that spend
+most of their time waiting on MySQL. Here those requests await their query
+on 'aio_db' so one process can hold many in flight. Every other request,
+including any the async handlers decline (bad key, missing or invalid args,
+streaming, results served from in-memory rollups), is passed unchanged to
+the Flask app, which runs on a pool of ASGI_THREADS threads so responses
+and errors are identical to the WSGI entry point. Both paths record the same
+request metrics and Server-Timing header.
+"""
+import functools
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from werkzeug.http import parse_accept_header
+from werkzeug.urls import url_decode
+from registhor_app import aio_db, create_app
+from registhor_app.clustering import parse_zoom
+from registhor_app.compression import _choose_encoding, _compress
+from registhor_app.config import Config
+from registhor_app.offerings_routes.queries import queries as offerings_queries
+from registhor_app.offerings_routes.routes import offering_args
+from registhor_app.timing import request_duration, server_timing, span, start_task_spans
+from registhor_app.utils import _decode_cursor, _dumps, _encode_cursor, _json_default
+
+
+class AsyncApp:
+	"""ASGI callable dispatching paths in 'routes' to async handlers and all
+	other requests to the wrapped Flask app.
+	"""
+
+	def __init__(self, flask_app):
+		self.flask_app = flask_app
+		self.config = flask_app.config
+		self.wsgi = PooledWsgiToAsgi(flask_app, self.config['ASGI_THREADS'])
+		# Maps path -> (endpoint name for metrics, handler)
+		self.routes = {
+			'/api/v1/offerings/offering-information': ('offerings.offering_info', self.offering_info),
+			'/api/v1/offerings/counts-by-city': ('offerings.offering_counts', self.offering_counts)
+		}
+
+	async def __call__(self, scope, receive, send):
+		if scope['type'] == 'lifespan':
+			await self.lifespan(receive, send)
+			return
+		route = self.routes.get(scope['path'], None) if scope['type'] == 'http' and scope['method'] == 'GET' else None
+		if route is not None:
+			start = time.perf_counter()
+			spans = start_task_spans()
+			args = url_decode(scope['query_string'])
+			# Leave auth errors to Flask
+			if args.get('key', None) and args.get('key') == os.environ.get('REGISTHOR_API_KEY'):
+				endpoint, handler = route
+				results = await handler(args)
+				if results is not None:
+					await self.send_json(scope, send, results, args, endpoint, start, spans)
+					return
+		await self.wsgi(scope, receive, send)
+
+	async def lifespan(self, receive, send):
+		"""Open the async pool on startup and close it on shutdown."""
+		while True:
+			message = await receive()
+			if message['type'] == 'lifespan.startup':
+				try:
+					await aio_db.init_pool(self.config)
+				except Exception as e:
+					await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+					return
+				await send({'type': 'lifespan.startup.complete'})
+			elif message['type'] == 'lifespan.shutdown':
+				await aio_db.close_pool()
+				self.wsgi.executor.shutdown(wait=False)
+				await send({'type': 'lifespan.shutdown.complete'})
+				return
+
+	async def offering_info(self, args):
+		"""Async 'offerings.offering_info'; returns None to defer to Flask."""
+		params = offering_args(args)
+		limit = args.get('limit', '999999')
+		offset = args.get('offset', '0')
+		if params is None or not limit.isdigit() or not offset.isdigit() or args.get('stream', '') in ('json', 'ndjson'):
+			return None
+		(date_1, date_2, offering_status, course_code, instructor_name,
+		 business_line, clients_only, lang) = params
+
+		cursor = args.get('cursor', None)
+		if cursor is not None:
+			try:
+				after = _decode_cursor(cursor, 3)
+			except ValueError:
+				return None
+			results, next_key = await offerings_queries.load_offering_info_page_async(
+				date_1, date_2, offering_status, course_code, instructor_name, business_line, clients_only, limit, after, lang)
+			next_cursor = _encode_cursor(next_key) if next_key is not None else None
+			return {'results': results, 'next_cursor': next_cursor, 'status': 'OK'}
+
+		results = await offerings_queries.load_offering_info_async(
+			date_1, date_2, offering_status, course_code, instructor_name, business_line, clients_only, limit, offset, lang)
+		return {'results': results, 'status': 'OK'}
+
+	async def offering_counts(self, args):
+		"""Async 'offerings.offering_counts'; returns None to defer to Flask,
+		including when the in-memory rollup can answer without the DB.
+		"""
+		params = offering_args(args)
+		if params is None:
+			return None
+		(date_1, date_2, offering_status, course_code, instructor_name,
+		 business_line, clients_only, lang) = params
+		if self.config['ROLLUPS_ENABLED'] and not instructor_name:
+			return None
+		try:
+			zoom = parse_zoom(args.get('zoom', None))
+		except ValueError:
+			return None
+
+		results = await offerings_queries.load_offering_counts_async(
+			date_1, date_2, offering_status, course_code, instructor_name, business_line, clients_only, lang, zoom)
+		return {'results': results, 'status': 'OK'}
+
+	async def send_json(self, scope, send, results, args, endpoint, start, spans):
+		"""Send results as JSON formatted and compressed as Flask would, with
+		the request's duration recorded and sent as 'timing._add_server_timing'
+		does.
+		"""
+		with span('serialize'):
+			if args.get('format', None) == 'compact' or self.config['COMPACT_JSON']:
+				body = _dumps(results) + '\n'
+			else:
+				body = json.dumps(results, default=_json_default, ensure_ascii=False, indent=2, separators=(', ', ': ')) + '\n'
+			body = body.encode('utf-8')
+
+		accept_encoding = dict(scope['headers']).get(b'accept-encoding', b'').decode('latin-1')
+		headers = [(b'content-type', b'application/json'),
+				   # As flask_cors does for '/api/*'
+				   (b'access-control-allow-origin', b'*')]
+		if self.config['COMPRESSION_ENABLED']:
+			headers.append((b'vary', b'Accept-Encoding'))
+			encoding = _choose_encoding(parse_accept_header(accept_encoding))
+			if encoding is not None and len(body) >= self.config['COMPRESSION_MIN_SIZE']:
+				body = _compress(body, encoding, self.config)
+				headers.append((b'content-encoding', encoding.encode('ascii')))
+		headers.append((b'content-length', str(len(body)).encode('ascii')))
+		if self.config['TIMING_ENABLED']:
+			elapsed = time.perf_counter() - start
+			request_duration.observe((endpoint, 'GET', '200'), elapsed)
+			headers.append((b'server-timing', server_timing(spans, elapsed).encode('ascii')))
+
+		await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+		await send({'type': 'http.response.body', 'body': body})
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+	"""As asgiref's 'WsgiToAsgi' but running the WSGI app on a pool of
+	'max_workers' threads, rather than the one thread 'sync_to_async' shares
+	between all requests by default.
+	"""
+
+	def __init__(self, wsgi_application, max_workers):
+		super().__init__(wsgi_application)
+		self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='registhor-wsgi')
+
+	async def __call__(self, scope, receive, send):
+		instance = WsgiToAsgiInstance(self.wsgi_application)
+		# 'run_wsgi_app' is decorated with a thread-sensitive 'sync_to_async';
+		# rewrap the undecorated method to run on the pool
+		run_wsgi_app = WsgiToAsgiInstance.__dict__['run_wsgi_app'].func
+		instance.run_wsgi_app = sync_to_async(functools.partial(run_wsgi_app, instance),
+											  thread_sensitive=False, executor=self.executor)
+		await instance(scope, receive, send)
+
+
+def create_asgi_app(config_class=Config):
+	"""Application factory for the ASGI entry point."""
+	return AsyncApp(create_app(config_class))
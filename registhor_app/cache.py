@@ -0,0 +1,185 @@
+import copy
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from registhor_app.config import Config
+
+
+class LocalCache:
+	"""In-process LRU cache whose entries expire after a TTL. Each worker
+	holds its own copy.
+	"""
+
+	def __init__(self, max_entries):
+		self.max_entries = max_entries
+		self._data = OrderedDict()
+		self._lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+
+	def get(self, key):
+		"""Return (True, value) if key cached and fresh, else (False, None)."""
+		with self._lock:
+			entry = self._data.get(key, None)
+			if entry is None or entry[0] < time.monotonic():
+				if entry is not None:
+					del self._data[key]
+				self.misses += 1
+				return False, None
+			self._data.move_to_end(key)
+			self.hits += 1
+		# Copy so that callers mutating results can't corrupt the cache
+		return True, copy.deepcopy(entry[1])
+
+	def set(self, key, value, ttl):
+		with self._lock:
+			self._data[key] = (time.monotonic() + ttl, copy.deepcopy(value))
+			self._data.move_to_end(key)
+			while len(self._data) > self.max_entries:
+				self._data.popitem(last=False)
+
+	def delete_prefix(self, prefix):
+		with self._lock:
+			for key in [key for key in self._data if key.startswith(prefix)]:
+				del self._data[key]
+
+	def clear(self):
+		with self._lock:
+			self._data.clear()
+
+	def stats(self):
+		with self._lock:
+			return {'backend': 'local', 'entries': len(self._data), 'hits': self.hits, 'misses': self.misses}
+
+
+class RedisCache:
+	"""Cache shared by all workers via Redis. Requires package 'redis'."""
+
+	def __init__(self, url, namespace='registhor:'):
+		# Import here so that 'redis' is only required if backend selected
+		import redis
+		self._client = redis.Redis.from_url(url)
+		self._namespace = namespace
+		self._lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+
+	def get(self, key):
+		raw = self._client.get(self._namespace + key)
+		with self._lock:
+			if raw is None:
+				self.misses += 1
+				return False, None
+			self.hits += 1
+		return True, pickle.loads(raw)
+
+	def set(self, key, value, ttl):
+		self._client.set(self._namespace + key, pickle.dumps(value), ex=int(ttl))
+
+	def delete_prefix(self, prefix):
+		keys = list(self._client.scan_iter(match=self._namespace + prefix + '*'))
+		if keys:
+			self._client.delete(*keys)
+
+	def clear(self):
+		self.delete_prefix('')
+
+	def stats(self):
+		with self._lock:
+			return {'backend': 'redis', 'hits': self.hits, 'misses': self.misses}
+
+
+class NullCache:
+	"""Backend that never stores anything; used to disable caching."""
+
+	def get(self, key):
+		return False, None
+
+	def set(self, key, value, ttl):
+		pass
+
+	def delete_prefix(self, prefix):
+		pass
+
+	def clear(self):
+		pass
+
+	def stats(self):
+		return {'backend': 'null'}
+
+
+# Process-wide backend; replaced in init_app according to app config
+_backend = None
+_default_ttl = Config.CACHE_DEFAULT_TTL
+
+
+def _make_backend(config):
+	"""Instantiate the backend named by config 'CACHE_BACKEND'."""
+	backend = config['CACHE_BACKEND']
+	if backend == 'redis':
+		return RedisCache(config['CACHE_REDIS_URL'])
+	if backend == 'null':
+		return NullCache()
+	return LocalCache(config['CACHE_MAX_ENTRIES'])
+
+
+def _get_backend():
+	global _backend
+	if _backend is None:
+		_backend = _make_backend(vars(Config))
+	return _backend
+
+
+def _func_name(f):
+	return '{0}.{1}'.format(f.__module__, f.__qualname__)
+
+
+def cached(ttl=None):
+	"""Decorator caching a function's return value keyed on the function's
+	name and its arguments. Adds attribute 'invalidate' to the wrapped
+	function to drop all of its entries.
+	"""
+	def decorator(f):
+		prefix = _func_name(f) + ':'
+
+		@wraps(f)
+		def decorated(*args, **kwargs):
+			# Hash arguments to keep keys short and safe for any backend
+			arg_key = hashlib.sha1(repr((args, sorted(kwargs.items()))).encode('utf-8')).hexdigest()
+			key = prefix + arg_key
+			backend = _get_backend()
+			hit, value = backend.get(key)
+			if hit:
+				return value
+			value = f(*args, **kwargs)
+			backend.set(key, value, ttl if ttl is not None else _default_ttl)
+			return value
+
+		decorated.invalidate = lambda: _get_backend().delete_prefix(prefix)
+		return decorated
+	return decorator
+
+
+def invalidate(f=None):
+	"""Drop cached entries for function f, or every entry if f is None.
+	Call after the nightly data load.
+	"""
+	if f is None:
+		_get_backend().clear()
+	else:
+		_get_backend().delete_prefix(_func_name(getattr(f, '__wrapped__', f)) + ':')
+
+
+def cache_stats():
+	"""Return hit/miss counters for monitoring."""
+	return _get_backend().stats()
+
+
+def init_app(app):
+	"""In factory function, select the cache backend from app config."""
+	global _backend, _default_ttl
+	_backend = _make_backend(app.config)
+	_default_ttl = app.config['CACHE_DEFAULT_TTL']
@@ -0,0 +1,108 @@
+"""Combine nearby city markers so maps aren't overdrawn e.g. Kanata, Vanier
+-> Ottawa.
+
+Points are hashed into a grid of square cells whose size depends on the map's
+zoom level. Clusters are seeded from the largest cities first and absorb every
+unclaimed point within one cell size, searching the seed's cell and its eight
+neighbours so that points either side of a cell edge still merge. Input order
+doesn't affect the output and input dicts aren't modified.
+"""
+import math
+from collections import defaultdict
+from registhor_app.timing import timed
+
+# NumPy is optional; used to compute grid cells for large inputs
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+# Cell size, in degrees, if no zoom level given; matches the previous
+# behaviour of rounding coordinates to 1 decimal place
+DEFAULT_CELL_SIZE = 0.1
+# Markers closer than this many pixels on screen are combined
+CLUSTER_RADIUS_PX = 40
+TILE_SIZE_PX = 256
+MAX_ZOOM = 20
+# Below this many points, plain Python is faster than converting to arrays
+NUMPY_MIN_POINTS = 1000
+
+
+def cell_size(zoom=None):
+	"""Return width in degrees of CLUSTER_RADIUS_PX at a web map zoom level."""
+	if zoom is None:
+		return DEFAULT_CELL_SIZE
+	return CLUSTER_RADIUS_PX / TILE_SIZE_PX * 360 / 2 ** zoom
+
+
+@timed('munge')
+def cluster_markers(markers, zoom=None):
+	"""Return new marker dicts ('offering_city', 'offering_lat',
+	'offering_lng', 'count') with nearby markers combined, largest first.
+	Each cluster takes the name of its largest city and the count-weighted
+	centroid of its members. Markers lacking coordinates (e.g. webcasts) are
+	combined by city name.
+	"""
+	size = cell_size(zoom)
+	located = []
+	unlocated = defaultdict(int)
+	for my_dict in markers:
+		if my_dict['offering_lat'] == '' or my_dict['offering_lng'] == '':
+			unlocated[my_dict['offering_city']] += my_dict['count']
+		else:
+			located.append((my_dict['offering_city'], float(my_dict['offering_lat']), float(my_dict['offering_lng']), my_dict['count']))
+
+	# Seed clusters from largest cities; remaining keys make order total
+	located.sort(key=lambda point: (-point[3], point[0], point[1], point[2]))
+	cells = _assign_cells(located, size)
+	grid = defaultdict(list)
+	for i, cell in enumerate(cells):
+		grid[cell].append(i)
+
+	claimed = [False] * len(located)
+	results = []
+	for i, (city, lat, lng, count) in enumerate(located):
+		if claimed[i]:
+			continue
+		claimed[i] = True
+		total, lat_sum, lng_sum = count, lat * count, lng * count
+		row, col = cells[i]
+		for neighbour in ((row + d_row, col + d_col) for d_row in (-1, 0, 1) for d_col in (-1, 0, 1)):
+			for j in grid.get(neighbour, ()):
+				if claimed[j]:
+					continue
+				other_lat, other_lng, other_count = located[j][1], located[j][2], located[j][3]
+				if abs(other_lat - lat) <= size and abs(other_lng - lng) <= size:
+					claimed[j] = True
+					total += other_count
+					lat_sum += other_lat * other_count
+					lng_sum += other_lng * other_count
+		# Fall back to seed's position if counts are all zero
+		centroid_lat = round(lat_sum / total, 6) if total else lat
+		centroid_lng = round(lng_sum / total, 6) if total else lng
+		results.append({'offering_city': city, 'offering_lat': centroid_lat, 'offering_lng': centroid_lng, 'count': total})
+
+	results.extend({'offering_city': city, 'offering_lat': '', 'offering_lng': '', 'count': count}
+				   for city, count in unlocated.items())
+	results.sort(key=lambda my_dict: (-my_dict['count'], my_dict['offering_city']))
+	return results
+
+
+def _assign_cells(located, size):
+	"""Return (row, col) grid cell of each point."""
+	if np is not None and len(located) >= NUMPY_MIN_POINTS:
+		coords = np.array([(lat, lng) for _, lat, lng, _ in located], dtype=float)
+		cells = np.floor(coords / size).astype(np.int64)
+		return [tuple(cell) for cell in cells.tolist()]
+	return [(math.floor(lat / size), math.floor(lng / size)) for _, lat, lng, _ in located]
+
+
+def parse_zoom(zoom):
+	"""Return zoom level from a query string value, None if not given, or
+	raise ValueError if invalid.
+	"""
+	if zoom is None or zoom == '':
+		return None
+	if not zoom.isdigit() or int(zoom) > MAX_ZOOM:
+		raise ValueError('Invalid zoom; must be an integer from 0 to {0}.'.format(MAX_ZOOM))
+	return int(zoom)
@@ -0,0 +1,63 @@
+from registhor_app.config import Config
+from registhor_app.db import query_mysql
+from registhor_app.registrations_routes.utils import fields
+from registhor_app.snapshot import Snapshot
+from registhor_app.utils import _unpack_tuples
+
+
+class CodeIndex(Snapshot):
+	"""Sets of active course and department codes shared by all requests in
+	a process, so validation needn't re-scan the LSR.
+	"""
+
+	def is_active_course(self, course_code):
+		return course_code in self.get()[0]
+
+	def is_active_department(self, department_code):
+		return department_code in self.get()[1]
+
+	def invalid_course_codes(self, course_codes):
+		"""Return the subset of course_codes that aren't active, in order."""
+		active_course_codes = self.get()[0]
+		return [course_code for course_code in course_codes if course_code not in active_course_codes]
+
+	def stats(self):
+		results = super().stats()
+		if self._data is not None:
+			results['course_codes'] = len(self._data[0])
+			results['department_codes'] = len(self._data[1])
+		return results
+
+	def _load(self):
+		return frozenset(_load_course_codes()), frozenset(_load_department_codes())
+
+
+def _load_course_codes():
+	"""Query all course codes seen in the LSR."""
+	query = """
+		SELECT course_code
+		FROM lsr_last_year
+		UNION
+		SELECT course_code
+		FROM lsr_this_year;
+	"""
+	results = query_mysql(query)
+	return _unpack_tuples(results)
+
+
+def _load_department_codes():
+	"""Query all valid department codes."""
+	query = """
+		SELECT dept_code
+		FROM departments;
+	"""
+	results = query_mysql(query)
+	return [code for code in _unpack_tuples(results) if code not in fields.JUNK_DEPT_CODES]
+
+
+code_index = CodeIndex('code_index', Config.CODE_INDEX_REFRESH_INTERVAL)
+
+
+def init_app(app):
+	"""In factory function, apply the configured refresh interval."""
+	code_index.refresh_interval = app.config['CODE_INDEX_REFRESH_INTERVAL']
@@ -0,0 +1,200 @@
+import math
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from registhor_app.config import Config
+from registhor_app.db import query_mysql
+from registhor_app.snapshot import Snapshot
+from registhor_app.utils import _fold
+
+# BM25 parameters: term frequency saturation and document length normalization
+K1 = 1.2
+B = 0.75
+
+TOKEN = re.compile(r'\w+')
+
+# Folded, as tokens are; single letters (e.g. elided "l'" and "d'") are
+# dropped regardless
+STOPWORDS = frozenset("""
+	about all also an and are as at be been but by can could did do for from had has have he her his how if in
+	into is it its just me more my no not of on or our she so than that the their them there they this to too
+	us was we were what when which who will with would you your
+	au aux avec ce ces cet cette dans de des du elle elles en est et etait etre eu il ils je la le les leur leurs
+	lui ma mais me mes mon ne nous on ou par pas plus pour qu que qui sa se ses son sont sur ta te tes ton tres
+	tu un une vos votre vous
+""".split())
+
+
+class CommentIndex(Snapshot):
+	"""Inverted index over 'comments.text_answer' for ranked full-text search.
+
+	Comments are indexed in segments: each refresh indexes only comments
+	with a higher 'survey_id' than any seen, as a new segment, so keeping up
+	with new comments costs a query over just those rows. Edited or deleted
+	comments are picked up by a full rebuild, which happens on 'invalidate'
+	(e.g. after the nightly load) or once there are too many segments. Text
+	is folded and split the same way in English and French, so 'ete' finds
+	'été' and 'Été'.
+	"""
+
+	def __init__(self, name, refresh_interval, max_segments):
+		super().__init__(name, refresh_interval)
+		self.max_segments = max_segments
+		self._rebuild = True
+
+	def search(self, text, short_question, department_code, course_code, fiscal_year, stars, limit, offset):
+		"""Return 'survey_id's of a page of comments containing every term of
+		'text' and matching the filters, best match (BM25) first.
+		"""
+		terms = list(dict.fromkeys(_tokenize(text)))
+		if not terms:
+			return []
+		data = self.get()
+		if not data.size:
+			return []
+		average_length = data.total_length / data.size
+		weights = {}
+		for term in terms:
+			frequency = sum(len(segment.postings[term][0]) for segment in data.segments if term in segment.postings)
+			if not frequency:
+				return []
+			weights[term] = math.log(1 + (data.size - frequency + 0.5) / (frequency + 0.5))
+
+		wanted = (short_question, department_code, course_code or None, fiscal_year or None, stars)
+		hits = []
+		for segment in data.segments:
+			scores = segment.score(terms, weights, average_length)
+			hits.extend((score, segment.survey_ids[position]) for position, score in scores.items()
+						if _matches(segment.filters[position], wanted))
+		# Ties broken by newest first
+		hits.sort(key=lambda hit: (-hit[0], -hit[1]))
+		return [survey_id for _, survey_id in hits[offset:offset + limit]]
+
+	def invalidate(self):
+		"""Force a full rebuild on next lookup."""
+		self._rebuild = True
+		super().invalidate()
+
+	def stats(self):
+		results = super().stats()
+		if self._data is not None:
+			results['comments'] = self._data.size
+			results['segments'] = len(self._data.segments)
+		return results
+
+	def _load(self):
+		previous = self._data
+		if self._rebuild or previous is None or len(previous.segments) >= self.max_segments:
+			self._rebuild = False
+			try:
+				return _CommentIndexData([_Segment(_load_comments())])
+			except Exception:
+				# Rebuild next time rather than adding a segment
+				self._rebuild = True
+				raise
+		segment = _Segment(_load_comments(previous.max_survey_id))
+		if not segment.survey_ids:
+			return previous
+		return _CommentIndexData(previous.segments + [segment])
+
+
+class _CommentIndexData:
+	"""Segments of 'CommentIndex' and totals across them."""
+	__slots__ = ('segments', 'size', 'total_length', 'max_survey_id')
+
+	def __init__(self, segments):
+		self.segments = segments
+		self.size = sum(len(segment.survey_ids) for segment in segments)
+		self.total_length = sum(segment.total_length for segment in segments)
+		self.max_survey_id = max((segment.survey_ids[-1] for segment in segments if segment.survey_ids), default=None)
+
+
+class _Segment:
+	"""Postings of a batch of comments, never modified once built."""
+	__slots__ = ('survey_ids', 'filters', 'lengths', 'total_length', 'postings')
+
+	def __init__(self, rows):
+		self.survey_ids = []
+		# (short_question, learner_dept_code, course_code, fiscal_year, stars) per comment
+		self.filters = []
+		self.lengths = array('I')
+		# Maps term -> (positions of comments containing it, term frequencies)
+		postings = {}
+		for survey_id, short_question, department_code, course_code, fiscal_year, stars, text_answer in rows:
+			position = len(self.survey_ids)
+			tokens = _tokenize(text_answer or '')
+			self.survey_ids.append(survey_id)
+			# Codes upper-cased as routes do, since MySQL compares them ignoring case
+			self.filters.append((short_question, (department_code or '').upper(), (course_code or '').upper(), fiscal_year, stars))
+			self.lengths.append(len(tokens))
+			for term, frequency in Counter(tokens).items():
+				posting = postings.get(term, None)
+				if posting is None:
+					posting = postings[term] = (array('I'), array('I'))
+				posting[0].append(position)
+				posting[1].append(frequency)
+		self.total_length = sum(self.lengths)
+		self.postings = postings
+
+	def score(self, terms, weights, average_length):
+		"""Return {position: BM25 score} of comments containing every term."""
+		postings = [self.postings.get(term, None) for term in terms]
+		if None in postings:
+			return {}
+		scores = None
+		# Rarest term first so later terms only check the few candidates left
+		for term, (positions, frequencies) in sorted(zip(terms, postings), key=lambda item: len(item[1][0])):
+			if scores is None:
+				matches = zip(positions, frequencies)
+			elif len(scores) * 16 < len(positions):
+				matches = []
+				for position in scores:
+					i = bisect_left(positions, position)
+					if i < len(positions) and positions[i] == position:
+						matches.append((position, frequencies[i]))
+			else:
+				matches = [(position, frequency) for position, frequency in zip(positions, frequencies) if position in scores]
+			weight = weights[term]
+			term_scores = {}
+			for position, frequency in matches:
+				norm = 1 - B + B * self.lengths[position] / average_length
+				term_scores[position] = (scores[position] if scores else 0.0) + weight * frequency * (K1 + 1) / (frequency + K1 * norm)
+			scores = term_scores
+			if not scores:
+				break
+		return scores
+
+
+def _matches(filters, wanted):
+	"""Compare a comment's filter columns to requested values; None matches all."""
+	return all(value is None or value == actual for actual, value in zip(filters, wanted))
+
+
+def _tokenize(text):
+	"""Fold accents and case and split into words, dropping stopwords."""
+	return [token for token in TOKEN.findall(_fold(text)) if len(token) > 1 and token not in STOPWORDS]
+
+
+def _load_comments(after=None):
+	"""Query comments to index, only those with 'survey_id' above 'after' if
+	passed, in order of 'survey_id'.
+	"""
+	query = """
+		SELECT survey_id, short_question, learner_dept_code, course_code, fiscal_year, stars, text_answer
+		FROM comments
+		WHERE text_answer IS NOT NULL{0}
+		ORDER BY survey_id ASC;
+	""".format(' AND survey_id > %s' if after is not None else '')
+	return query_mysql(query, (after,) if after is not None else None)
+
+
+comment_index = CommentIndex('comment_index', Config.COMMENT_INDEX_REFRESH_INTERVAL, Config.COMMENT_INDEX_MAX_SEGMENTS)
+
+
+def init_app(app):
+	"""In factory function, apply the configured refresh interval and
+	segment limit.
+	"""
+	comment_index.refresh_interval = app.config['COMMENT_INDEX_REFRESH_INTERVAL']
+	comment_index.max_segments = app.config['COMMENT_INDEX_MAX_SEGMENTS']
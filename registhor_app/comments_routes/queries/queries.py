@@ -1,22 +1,53 @@
-import pandas as pd
-from registhor_app.db import query_mysql
+from functools import lru_cache
+from flask import current_app
+from registhor_app.comment_index import comment_index
+from registhor_app.db import query_mysql, stream_mysql
+from registhor_app.query_builder import QueryTemplate
+from registhor_app.rollups import comment_count_rollup
+from registhor_app.timing import timed
 from registhor_app.utils import _unpack_tuples
 
+# Optional filters are only emitted when supplied so that MySQL can use index
+# on (short_question, learner_dept_code, course_code, fiscal_year)
+COURSE_CODES_QUERY = QueryTemplate("""
+	SELECT DISTINCT course_code
+	FROM comments
+	WHERE
+		short_question = %s{filters}
+	ORDER BY 1 ASC;
+""")
+
+COUNTS_QUERY = QueryTemplate("""
+	SELECT stars, COUNT(survey_id)
+	FROM comments
+	WHERE
+		short_question = %s{filters}
+	GROUP BY 1;
+""")
+
+# Largest LIMIT MySQL accepts; used to select all rows
+EXPORT_ALL_ROWS = 18446744073709551615
+
+COMMENTS_QUERY = QueryTemplate("""
+	SELECT text_answer, course_code, learner_classif, offering_city_{lang}, fiscal_year, quarter, overall_satisfaction, stars, magnitude, nanos{extra_columns}
+	FROM comments
+	WHERE
+		short_question = %s{filters}
+	ORDER BY fiscal_year DESC, quarter DESC, survey_id DESC
+	LIMIT %s OFFSET %s;
+""")
+
 
 def load_course_codes(short_question, fiscal_year, department_code):
 	"""Return list of course codes that match criteria."""
-	query = """
-		SELECT DISTINCT course_code
-		FROM comments
-		WHERE
-			short_question = %s
-		AND
-			(fiscal_year = %s OR %s = '')
-		AND
-			(learner_dept_code = %s OR %s = '')
-		ORDER BY 1 ASC;
-	"""
-	results = query_mysql(query, (short_question, fiscal_year, fiscal_year, department_code, department_code))
+	if current_app.config['ROLLUPS_ENABLED']:
+		return comment_count_rollup.course_codes(short_question, fiscal_year, department_code)
+	
+	query, args = COURSE_CODES_QUERY.render([
+		('learner_dept_code = %s', department_code),
+		('fiscal_year = %s', fiscal_year)
+	])
+	results = query_mysql(query, (short_question,) + args)
 	results_processed = _unpack_tuples(results)
 	return results_processed
 
@@ -25,20 +56,15 @@ def load_counts(short_question, course_code, fiscal_year, department_code):
 	"""Return number of comments by star for a given short question, course code,
 	and fiscal year.
 	"""
-	query = """
-		SELECT stars, COUNT(survey_id)
-		FROM comments
-		WHERE
-			short_question = %s
-		AND
-			(course_code = %s OR %s = '')
-		AND
-			(fiscal_year = %s OR %s = '')
-		AND
-			(learner_dept_code = %s OR %s = '')
-		GROUP BY 1;
-	"""
-	results = query_mysql(query, (short_question, course_code, course_code, fiscal_year, fiscal_year, department_code, department_code))
+	if current_app.config['ROLLUPS_ENABLED']:
+		return comment_count_rollup.counts(short_question, course_code, fiscal_year, department_code)
+	
+	query, args = COUNTS_QUERY.render([
+		('learner_dept_code = %s', department_code),
+		('course_code = %s', course_code),
+		('fiscal_year = %s', fiscal_year)
+	])
+	results = query_mysql(query, (short_question,) + args)
 	results = dict(results)
 	# Ensure all stars from 1-5 present in dict
 	stars = range(1, 6)
@@ -50,68 +76,106 @@ def load_comments(short_question, course_code, lang, fiscal_year, department_cod
 	"""Return all comments of a given type (e.g. general comments) for a
 	given course code.
 	"""
-	field_name = 'offering_city_{0}'.format(lang)
+	query, args = _comments_query(short_question, course_code, lang, fiscal_year, department_code, stars, limit, offset)
+	results = query_mysql(query, args)
+	# Munge raw data
+	results_processed = _munge_comments(results, lang)
+	return results_processed
+
+
+def load_comments_page(short_question, course_code, lang, fiscal_year, department_code, stars, limit, after):
+	"""Return a page of comments following sort key 'after' (keyset
+	pagination) and the sort key of the page's last row, or None if there
+	are no further pages. Pass an empty 'after' for the first page.
+	"""
+	query, args = _comments_query(short_question, course_code, lang, fiscal_year, department_code, stars, limit, 0, after)
+	results = query_mysql(query, args)
+	# Last column is tiebreaker 'survey_id'; key = (fiscal_year, quarter, survey_id)
+	next_key = [results[-1][4], results[-1][5], results[-1][10]] if results and len(results) == int(limit) else None
+	results_processed = _munge_comments([row[:10] for row in results], lang)
+	return results_processed, next_key
+
+
+def stream_comments(short_question, course_code, lang, fiscal_year, department_code, stars, limit, offset, batch_size):
+	"""Yield comments matching criteria in batches of munged rows."""
+	query, args = _comments_query(short_question, course_code, lang, fiscal_year, department_code, stars, limit, offset)
+	for results in stream_mysql(query, args, batch_size=batch_size):
+		yield _munge_comments(results, lang)
+
+
+def export_comments(short_question, course_code, lang, fiscal_year, department_code, stars, batch_size):
+	"""Yield every comment matching criteria, without limit, in batches of
+	munged rows.
+	"""
+	query, args = _comments_query(short_question, course_code, lang, fiscal_year, department_code, stars, EXPORT_ALL_ROWS, 0)
+	for results in stream_mysql(query, args, batch_size=batch_size):
+		yield _munge_comments(results, lang) or []
+
+
+def search_comments(text, short_question, course_code, lang, fiscal_year, department_code, stars, limit, offset):
+	"""Return a page of comments containing every word of 'text' and
+	matching criteria, best match first.
+	"""
+	survey_ids = comment_index.search(text, short_question, department_code, course_code, fiscal_year, stars, int(limit), int(offset))
+	if not survey_ids:
+		return []
 	query = """
-		SELECT text_answer, course_code, learner_classif, {0}, fiscal_year, quarter, overall_satisfaction, stars, magnitude, nanos
+		SELECT survey_id, text_answer, course_code, learner_classif, offering_city_{0}, fiscal_year, quarter, overall_satisfaction, stars, magnitude, nanos
 		FROM comments
 		WHERE
 			short_question = %s
-		AND
-			(course_code = %s OR %s = '')
-		AND
-			(fiscal_year = %s OR %s = '')
-		AND
-			(learner_dept_code = %s OR %s = '')
-		AND
-			(stars = %s OR %s = '')
-		ORDER BY 5 DESC, 6 DESC
-		LIMIT %s OFFSET %s;
-	""".format(field_name)
-	results = query_mysql(query, (short_question, course_code, course_code, fiscal_year,
-								  fiscal_year, department_code, department_code, stars,
-								  stars, int(limit), int(offset)))
-	# Munge raw data with Pandas
-	results_processed = _munge_comments(results, lang)
-	return results_processed
+			AND survey_id IN ({1});
+	""".format(lang, ', '.join(['%s'] * len(survey_ids)))
+	# Filter on question too as a survey may have a row per question
+	results = query_mysql(query, (short_question,) + tuple(survey_ids))
+	# Restore rank order; comments deleted since indexing are skipped
+	rows = {row[0]: row[1:] for row in results}
+	results = [rows[survey_id] for survey_id in survey_ids if survey_id in rows]
+	return _munge_comments(results, lang)
+
+
+def _comments_query(short_question, course_code, lang, fiscal_year, department_code, stars, limit, offset, after=None):
+	"""Return SQL and args for 'load_comments', 'load_comments_page' and
+	'stream_comments'. If 'after' isn't None, select 'survey_id' as an extra
+	column and seek past sort key 'after' instead of using OFFSET.
+	"""
+	keyset = after is not None
+	# Seek past last row of previous page
+	seek = (after[0], after[0], after[1], after[1], after[2]) if keyset and after else None
+	query, args = COMMENTS_QUERY.render([
+		('learner_dept_code = %s', department_code),
+		('course_code = %s', course_code),
+		('fiscal_year = %s', fiscal_year),
+		('stars = %s', stars),
+		('(fiscal_year < %s OR (fiscal_year = %s AND (quarter < %s OR (quarter = %s AND survey_id < %s))))', seek)
+	], lang=lang, extra_columns=', survey_id' if keyset else '')
+	args = (short_question,) + args + (int(limit), int(offset))
+	return query, args
 
 
+@timed('munge')
 def _munge_comments(raw, lang):
-	"""Munge raw data with Pandas and process into form required for API. Return
-	False if course has received no comments.
+	"""Process raw rows into form required for API. Return False if course
+	has received no comments.
 	"""
-	# Load raw data into DataFrame
-	results = pd.DataFrame(raw, columns=['text_answer', 'course_code', 'learner_classif',
-										 'offering_city', 'fiscal_year', 'quarter',
-										 'overall_satisfaction', 'stars', 'magnitude', 'nanos'])
-	
 	# Return False if course has received no feedback
-	if results.empty:
+	if not raw:
 		return False
 	
-	# Account null values in 'overall_satisfaction' and 'stars'
-	results['overall_satisfaction'].fillna(0, inplace=True)
-	results['stars'].fillna(0, inplace=True)
-	
 	results_processed = []
 	# Unpack tuple as some fields require customization
-	for row in results.itertuples(index=False):
-		text_answer = row[0]
-		course_code = row[1].upper()
-		# Account for 'Unknown' being 'Inconnu' in FR
-		learner_classif = row[2]
-		learner_classif = learner_classif.replace(' - Unknown', '')
-		learner_classif = learner_classif.replace('Unknown', 'Inconnu') if lang == 'fr' else learner_classif
-		# Account for English vs French title formatting
-		offering_city = row[3]
+	for (text_answer, course_code, learner_classif, offering_city, fiscal_year, quarter,
+		 overall_satisfaction, stars, magnitude, nanos) in raw:
+		course_code = course_code.upper()
+		# Distinct classifications, cities and quarters are few so each is
+		# formatted once per process and then looked up
+		learner_classif = _format_classif(learner_classif, lang)
 		offering_city = _format_city(offering_city, lang)
-		fiscal_year = row[4]
-		# Account for e.g. 'Q2' being 'T2' in FR
-		quarter = row[5]
-		quarter = quarter.replace('Q', 'T') if lang == 'fr' else quarter
-		overall_satisfaction = int(row[6])
-		stars = int(row[7])
-		magnitude = float(row[8])
-		nanos = row[9]
+		quarter = _format_quarter(quarter, lang)
+		# Account null values in 'overall_satisfaction' and 'stars'
+		overall_satisfaction = int(overall_satisfaction) if overall_satisfaction is not None else 0
+		stars = int(stars) if stars is not None else 0
+		magnitude = float(magnitude) if magnitude is not None else float('nan')
 		# Reassemble and append
 		tup = (text_answer, course_code, learner_classif, offering_city, fiscal_year, quarter,
 			   overall_satisfaction, stars, magnitude, nanos)
@@ -119,6 +183,24 @@ def _munge_comments(raw, lang):
 	return results_processed
 
 
+# Max distinct (value, lang) pairs remembered by each formatter
+FORMAT_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def _format_classif(my_string, lang):
+	"""Account for 'Unknown' being 'Inconnu' in FR."""
+	s = my_string.replace(' - Unknown', '')
+	return s.replace('Unknown', 'Inconnu') if lang == 'fr' else s
+
+
+@lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def _format_quarter(my_string, lang):
+	"""Account for e.g. 'Q2' being 'T2' in FR."""
+	return my_string.replace('Q', 'T') if lang == 'fr' else my_string
+
+
+@lru_cache(maxsize=FORMAT_CACHE_SIZE)
 def _format_city(my_string, lang):
 	"""Correct English and French formatting edge cases."""
 	if lang == 'fr':
@@ -131,3 +213,18 @@ def _format_city(my_string, lang):
 		s = my_string.title()
 		s = s.replace('(Ncr)', '(NCR)').replace("'S", "'s")
 		return s
+
+
+def format_cache_stats():
+	"""Return hit/miss counters of the memoized formatters."""
+	results = {}
+	for func in (_format_city, _format_classif, _format_quarter):
+		info = func.cache_info()
+		lookups = info.hits + info.misses
+		results[func.__name__.lstrip('_')] = {
+			'hits': info.hits,
+			'misses': info.misses,
+			'entries': info.currsize,
+			'hit_rate': round(info.hits / lookups, 4) if lookups else 0.0
+		}
+	return results
@@ -1,7 +1,10 @@
-from flask import Blueprint, request
+from flask import Blueprint, current_app, request
 from registhor_app.comments_routes.queries import queries
 from registhor_app.comments_routes.utils import fields
-from registhor_app.utils import check_api_key, _invalid_args, _missing_args, _valid_get
+from registhor_app.export import export_formats, _valid_export
+from registhor_app.utils import (check_api_key, _decode_cursor, _encode_cursor,
+	_invalid_args, _missing_args, _stream_mode, _valid_get, _valid_get_page,
+	_valid_get_stream)
 
 # Instantiate blueprint
 comments = Blueprint('comments', __name__)
@@ -75,6 +78,28 @@ def text(short_question, methods=['GET']):
 	if not limit.isdigit() or not offset.isdigit():
 		return _invalid_args('Invalid limit and/or offset.')
 	
+	# If 'cursor' passed (empty for first page), use keyset pagination so
+	# deep pages don't make MySQL scan and discard every skipped row
+	cursor = request.args.get('cursor', None)
+	if cursor is not None:
+		try:
+			after = _decode_cursor(cursor, 3)
+		except ValueError as e:
+			return _invalid_args(str(e))
+		results, next_key = queries.load_comments_page(short_question, course_code, lang, fiscal_year, department_code, stars, limit, after)
+		results = [_make_dict(tup, lang) for tup in results] if results else []
+		next_cursor = _encode_cursor(next_key) if next_key is not None else None
+		return _valid_get_page(results, next_cursor)
+	
+	# If requested, stream rows as they're fetched to cap memory use
+	stream = _stream_mode()
+	if stream:
+		batches = queries.stream_comments(short_question, course_code, lang, fiscal_year, department_code, stars,
+										  limit, offset, current_app.config['STREAM_BATCH_SIZE'])
+		# '_munge_comments' returns False for an empty batch
+		batches = ([_make_dict(tup, lang) for tup in batch] if batch else [] for batch in batches)
+		return _valid_get_stream(batches, ndjson=(stream == 'ndjson'))
+	
 	# Run query and return as JSON
 	results = queries.load_comments(short_question, course_code, lang, fiscal_year, department_code, stars, limit, offset)
 	if not results:
@@ -84,10 +109,81 @@ def text(short_question, methods=['GET']):
 	return results_processed
 
 
+@comments.route('/api/v1/comments/search/<string:short_question>')
+@check_api_key
+def search(short_question, methods=['GET']):
+	"""Return comments of a given type containing every word of 'q', best
+	match first.
+	"""
+	# Unpack arguments
+	# Only allow 'en' and 'fr' to be passed to app
+	lang = 'fr' if request.args.get('lang', None) == 'fr' else 'en'
+	short_question = fields.QUESTION_DICT.get(short_question, None)
+	text = request.args.get('q', '')
+	course_code = request.args.get('course_code', '').upper()
+	department_code = request.args.get('department_code', '').upper()
+	fiscal_year = request.args.get('fiscal_year', '')
+	stars = request.args.get('stars', '')
+	limit = request.args.get('limit', '')
+	offset = request.args.get('offset', '0')
+	
+	# Mandatory arguments
+	if short_question is None:
+		return _invalid_args('Invalid question type.')
+	missing = [arg for arg, val in (('q', text.strip()), ('department_code', department_code), ('limit', limit)) if not val]
+	if missing:
+		return _missing_args(missing=missing)
+	
+	# Ensure args 'limit', 'offset' and, if passed, 'stars' are integers
+	if not limit.isdigit() or not offset.isdigit() or (stars and not stars.isdigit()):
+		return _invalid_args('Invalid limit, offset and/or stars.')
+	
+	results = queries.search_comments(text, short_question, course_code, lang, fiscal_year, department_code,
+									  int(stars) if stars else None, limit, offset)
+	results = [_make_dict(tup, lang) for tup in results] if results else []
+	results_processed = _valid_get(results)
+	return results_processed
+
+
+@comments.route('/api/v1/comments/export/<string:short_question>')
+@check_api_key
+def export(short_question, methods=['GET']):
+	"""Stream every comment of a given type matching criteria as a CSV,
+	NDJSON or Parquet file.
+	"""
+	# Unpack arguments
+	# Only allow 'en' and 'fr' to be passed to app
+	lang = 'fr' if request.args.get('lang', None) == 'fr' else 'en'
+	short_question_db = fields.QUESTION_DICT.get(short_question, None)
+	course_code = request.args.get('course_code', '').upper()
+	department_code = request.args.get('department_code', '').upper()
+	fiscal_year = request.args.get('fiscal_year', '')
+	stars = request.args.get('stars', '')
+	format_ = request.args.get('format', 'csv')
+	
+	# Mandatory arguments
+	if short_question_db is None:
+		return _invalid_args('Invalid question type.')
+	if not department_code:
+		return _missing_args(missing=['department_code'])
+	if format_ not in export_formats():
+		return _invalid_args('Invalid format; must be one of {0}.'.format(', '.join(export_formats())))
+	
+	batches = queries.export_comments(short_question_db, course_code, lang, fiscal_year, department_code, stars,
+									  current_app.config['STREAM_BATCH_SIZE'])
+	filename = '-'.join(val for val in ('comments', short_question, department_code, course_code, fiscal_year) if val)
+	return _valid_export(batches, list(zip(COMMENT_LABELS, COMMENT_TYPES)), format_, filename)
+
+
+# Keys of comment objects, in order of tuples returned by 'queries._munge_comments'
+COMMENT_LABELS = ('comment_text', 'course_code', 'learner_classification', 'offering_city',
+				  'offering_fiscal_year', 'offering_quarter',
+				  'overall_satisfaction', 'stars', 'magnitude', 'nanos')
+# Parquet types of the above for exports
+COMMENT_TYPES = ('string', 'string', 'string', 'string', 'string', 'string',
+				 'int64', 'int64', 'double', 'int64')
+
+
 def _make_dict(my_tup, lang):
 	"""Make tuple in a dictionary so can be jsonified into an object."""
-	labels = ['comment_text', 'course_code', 'learner_classification', 'offering_city',
-			  'offering_fiscal_year', 'offering_quarter', 
-			  'overall_satisfaction', 'stars', 'magnitude', 'nanos']
-	results = {key: val for key, val in zip(labels, my_tup)}
-	return results
+	return dict(zip(COMMENT_LABELS, my_tup))
@@ -0,0 +1,61 @@
+import gzip
+from flask import current_app, request
+from registhor_app.timing import span
+
+# Brotli is optional; fall back to gzip if not installed
+try:
+	import brotli
+except ImportError:
+	brotli = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/html', 'text/css'}
+
+
+def compress_response(response):
+	"""Compress response body with brotli or gzip if client accepts it and
+	body is at least 'COMPRESSION_MIN_SIZE' bytes. Registered as an
+	after_request hook.
+	"""
+	if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+			or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+		return response
+	response.vary.add('Accept-Encoding')
+
+	encoding = _choose_encoding(request.accept_encodings)
+	if encoding is None:
+		return response
+	data = response.get_data()
+	if len(data) < current_app.config['COMPRESSION_MIN_SIZE']:
+		return response
+
+	response.set_data(_compress(data, encoding, current_app.config))
+	response.headers['Content-Encoding'] = encoding
+	# Body now differs byte-wise from the uncompressed representation so, as
+	# nginx does, downgrade any strong ETag to weak
+	etag, weak = response.get_etag()
+	if etag and not weak:
+		response.set_etag(etag, weak=True)
+	return response
+
+
+def _choose_encoding(accept):
+	"""Return 'br' or 'gzip' per a parsed Accept-Encoding header, or None."""
+	if brotli is not None and accept['br']:
+		return 'br'
+	if accept['gzip']:
+		return 'gzip'
+	return None
+
+
+def _compress(data, encoding, config):
+	"""Compress bytes with 'br' or 'gzip' at the configured level."""
+	with span('compress'):
+		if encoding == 'br':
+			return brotli.compress(data, quality=config['COMPRESSION_BROTLI_QUALITY'])
+		return gzip.compress(data, compresslevel=config['COMPRESSION_GZIP_LEVEL'])
+
+
+def init_app(app):
+	"""In factory function, register compression of responses."""
+	if app.config['COMPRESSION_ENABLED']:
+		app.after_request(compress_response)
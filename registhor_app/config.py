@@ -7,3 +7,72 @@ class Config:
 	JSON_AS_ASCII = False
 	JSONIFY_PRETTYPRINT_REGULAR = True
 	JSON_SORT_KEYS = False
+	# Serve minified JSON by default rather than only on 'format=compact'
+	COMPACT_JSON = os.environ.get('COMPACT_JSON', 'false') == 'true'
+	# Options for response compression
+	COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true') == 'true'
+	# Bodies smaller than this many bytes are sent uncompressed
+	COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+	COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+	COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 5))
+	# Default seconds browsers and proxies may reuse responses of cacheable routes
+	HTTP_CACHE_MAX_AGE = int(os.environ.get('HTTP_CACHE_MAX_AGE', 300))
+	# Rows fetched from the DB per batch when streaming responses
+	STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', 1000))
+	# Record per-request stage timings, send Server-Timing headers and serve /metrics
+	TIMING_ENABLED = os.environ.get('TIMING_ENABLED', 'true') == 'true'
+	# Milliseconds after which a query is logged as slow
+	SLOW_QUERY_THRESHOLD = int(os.environ.get('SLOW_QUERY_THRESHOLD', 500))
+	# Options for MySQL connection pool
+	# Number of connections kept open between requests
+	DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+	# Extra connections that may be opened under load and closed when returned
+	DB_POOL_MAX_OVERFLOW = int(os.environ.get('DB_POOL_MAX_OVERFLOW', 10))
+	# Seconds after which a connection is replaced; -1 to disable
+	DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 3600))
+	# Ping connections before handing them out
+	DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true') == 'true'
+	# Seconds to wait for a free connection before erroring
+	DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+	# Threads per worker running a request's independent queries concurrently;
+	# each borrows a pooled connection while running
+	FANOUT_MAX_WORKERS = int(os.environ.get('FANOUT_MAX_WORKERS', 4))
+	# Threads per ASGI worker serving requests passed to the Flask app
+	ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 15))
+	# Options for query result cache
+	# One of 'local' (per-worker LRU), 'redis' (shared by all workers) or 'null'
+	CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'local')
+	CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+	# Seconds before cached results expire; LSR only changes on nightly load
+	CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', 3600))
+	CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+	# Seconds between reloads of the in-memory index of active course and
+	# department codes used to validate mandatory courses
+	CODE_INDEX_REFRESH_INTERVAL = int(os.environ.get('CODE_INDEX_REFRESH_INTERVAL', 600))
+	# Serve map endpoints from in-memory rollups rather than a GROUP BY per request
+	ROLLUPS_ENABLED = os.environ.get('ROLLUPS_ENABLED', 'true') == 'true'
+	# Seconds between rebuilds of the rollups
+	ROLLUP_REFRESH_INTERVAL = int(os.environ.get('ROLLUP_REFRESH_INTERVAL', 600))
+	# Serve tombstone routes from an in-memory copy of 'product_info'
+	PRODUCT_INFO_SNAPSHOT_ENABLED = os.environ.get('PRODUCT_INFO_SNAPSHOT_ENABLED', 'false') == 'true'
+	# Seconds between checks of whether 'product_info' has changed
+	PRODUCT_INFO_REFRESH_INTERVAL = int(os.environ.get('PRODUCT_INFO_REFRESH_INTERVAL', 300))
+	# Resolve offerings overlapping a date range from an in-memory interval
+	# index and fetch them by ID rather than scanning on start_date
+	INTERVAL_INDEX_ENABLED = os.environ.get('INTERVAL_INDEX_ENABLED', 'true') == 'true'
+	# Seconds between checks of whether 'offerings' has changed, reloading
+	# the interval index if so
+	INTERVAL_INDEX_REFRESH_INTERVAL = int(os.environ.get('INTERVAL_INDEX_REFRESH_INTERVAL', 60))
+	# Resolve filter 'instructor_name' from an in-memory trigram index rather
+	# than a leading-wildcard LIKE; the typeahead route always uses the index
+	INSTRUCTOR_INDEX_ENABLED = os.environ.get('INSTRUCTOR_INDEX_ENABLED', 'true') == 'true'
+	# Seconds between checks of whether 'offerings' has changed, reloading
+	# the instructor index if so
+	INSTRUCTOR_INDEX_REFRESH_INTERVAL = int(os.environ.get('INSTRUCTOR_INDEX_REFRESH_INTERVAL', 60))
+	# Above this many offerings matched by the interval and instructor
+	# indexes, fall back to the SQL predicates alone
+	INDEX_MAX_IDS = int(os.environ.get('INDEX_MAX_IDS', 1000))
+	# Seconds between indexing newly loaded comments for full-text search
+	COMMENT_INDEX_REFRESH_INTERVAL = int(os.environ.get('COMMENT_INDEX_REFRESH_INTERVAL', 300))
+	# Rebuild the comment index whole once it has this many segments
+	COMMENT_INDEX_MAX_SEGMENTS = int(os.environ.get('COMMENT_INDEX_MAX_SEGMENTS', 16))
@@ -1,47 +1,343 @@
 import os
-from flask import g
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, g
 import mysql.connector
+from mysql.connector.errors import Error as MySQLError
 from registhor_app.config import Config
+from registhor_app.timing import log_slow_query, span
+
+# Process-wide pool; created in init_app and shared by all requests
+_pool = None
+# Threads running independent queries of a request concurrently
+_executor = None
 
 
 def query_mysql(query, args=None, dict_=False):
 	"""Run query on connection stored in g."""
 	cnx = get_db()
 	cursor = cnx.cursor(dictionary=dict_)
-	cursor.execute(query, args)
-	results = cursor.fetchall()
+	start = time.perf_counter()
+	with span('execute'):
+		cursor.execute(query, args)
+	with span('fetch'):
+		results = cursor.fetchall()
+	log_slow_query(query, args, time.perf_counter() - start)
 	cursor.close()
 	return results
 
 
+def stream_mysql(query, args=None, dict_=False, batch_size=1000):
+	"""Run query on connection stored in g, yielding results in lists of
+	up to batch_size rows rather than loading them all at once. The cursor
+	is unbuffered so rows stay on the server until fetched.
+	"""
+	cnx = get_db()
+	cursor = cnx.cursor(dictionary=dict_, buffered=False)
+	# Time spent by the DB only, not by the consumer between batches
+	elapsed = 0.0
+	try:
+		start = time.perf_counter()
+		with span('execute'):
+			cursor.execute(query, args)
+		elapsed += time.perf_counter() - start
+		while True:
+			start = time.perf_counter()
+			with span('fetch'):
+				results = cursor.fetchmany(batch_size)
+			elapsed += time.perf_counter() - start
+			if not results:
+				break
+			yield results
+		log_slow_query(query, args, elapsed)
+	finally:
+		# If client disconnected mid-stream, unread rows make close raise;
+		# pool discards the connection when it fails to roll back
+		try:
+			cursor.close()
+		except MySQLError:
+			pass
+
+
 def insert_mysql(query, args=None):
 	"""Run commands on remote MySQL DB."""
 	cnx = get_db()
 	cursor = cnx.cursor()
-	cursor.execute(query, args)
-	cnx.commit()
+	start = time.perf_counter()
+	with span('execute'):
+		cursor.execute(query, args)
+		cnx.commit()
+	log_slow_query(query, args, time.perf_counter() - start)
 	cursor.close()
 
 
+def insert_many_mysql(query, seq_args):
+	"""Run a command once per set of args in a single transaction."""
+	cnx = get_db()
+	cursor = cnx.cursor()
+	try:
+		start = time.perf_counter()
+		with span('execute'):
+			cursor.executemany(query, seq_args)
+			cnx.commit()
+		log_slow_query(query, seq_args[0] if seq_args else None, time.perf_counter() - start)
+	except Exception:
+		cnx.rollback()
+		raise
+	finally:
+		cursor.close()
+
+
+def run_concurrently(*funcs):
+	"""Call independent zero-arg functions (e.g. functools.partial of a
+	query) concurrently and return their results in order. The first runs
+	in the calling thread on the request's connection; the others run in
+	worker threads, each inside its own app context on a spare pooled
+	connection returned when done. Workers never wait on the pool, as every
+	request thread holding a connection while its workers wait for another
+	would exhaust it; if none is spare, the rest run serially in the calling
+	thread. Exceptions are re-raised.
+	"""
+	if not funcs:
+		return []
+	app = current_app._get_current_object()
+	
+	def call_in_context(f, cnx):
+		with app.app_context():
+			# Returned to the pool by 'close_db' on teardown
+			g.db = cnx
+			return f()
+	
+	# Take the request's own connection first so it never waits behind its workers
+	get_db()
+	pool = _get_pool()
+	futures = []
+	for f in funcs[1:]:
+		cnx = pool.checkout(block=False)
+		if cnx is None:
+			break
+		futures.append(_get_executor().submit(call_in_context, f, cnx))
+	try:
+		results = [f() for f in (funcs[0],) + funcs[1 + len(futures):]]
+	finally:
+		# Wait for all so none outlives the request even if one fails
+		worker_results = [future.result() for future in futures]
+	return results[:1] + worker_results + results[1:]
+
+
+def _get_executor():
+	"""Return the process-wide fan-out thread pool, creating it from Config
+	if init_app hasn't been called.
+	"""
+	global _executor
+	if _executor is None:
+		_executor = ThreadPoolExecutor(max_workers=Config.FANOUT_MAX_WORKERS, thread_name_prefix='fanout')
+	return _executor
+
+
 def get_db():
-	"""Connect to DB and store connection in g for life of request."""
+	"""Borrow a connection from the pool and store it in g for life of
+	request.
+	"""
 	if 'db' not in g:
-		g.db = mysql.connector.connect(host=os.environ.get('DB_HOST'),
-									   user=os.environ.get('DB_USER'),
-									   password=os.environ.get('DB_PASSWORD'),
-									   database=os.environ.get('DB_DATABASE_NAME'))
+		with span('connect'):
+			g.db = _get_pool().checkout()
 	return g.db
 
 
 def close_db(e=None):
-	"""Remove connection to DB from g and close."""
+	"""Remove connection to DB from g and return it to the pool."""
 	db = g.pop('db', None)
 	if db is not None:
-		db.close()
+		_get_pool().checkin(db)
+
+
+def pool_stats():
+	"""Return a snapshot of the pool's counters for monitoring."""
+	return _get_pool().stats()
+
+
+def _connect():
+	"""Open a new connection to the remote MySQL DB."""
+	return mysql.connector.connect(host=os.environ.get('DB_HOST'),
+								   user=os.environ.get('DB_USER'),
+								   password=os.environ.get('DB_PASSWORD'),
+								   database=os.environ.get('DB_DATABASE_NAME'))
+
+
+def _get_pool():
+	"""Return the process-wide pool, creating it from Config if init_app
+	hasn't been called (e.g. in a script).
+	"""
+	global _pool
+	if _pool is None:
+		_pool = _make_pool(vars(Config))
+	return _pool
+
+
+def _make_pool(config):
+	"""Instantiate a ConnectionPool from a Flask config mapping."""
+	return ConnectionPool(size=config['DB_POOL_SIZE'],
+						  max_overflow=config['DB_POOL_MAX_OVERFLOW'],
+						  recycle=config['DB_POOL_RECYCLE'],
+						  pre_ping=config['DB_POOL_PRE_PING'],
+						  timeout=config['DB_POOL_TIMEOUT'])
+
+
+class ConnectionPool:
+	"""Thread-safe pool of MySQL connections.
+
+	Up to 'size' connections are kept open between requests; under load up to
+	'max_overflow' extra connections are opened and closed again when returned.
+	Connections older than 'recycle' seconds are replaced on checkout and, if
+	'pre_ping' is set, pinged before being handed out so that connections
+	dropped by the server (e.g. 'wait_timeout') are never given to a request.
+	"""
+
+	def __init__(self, size, max_overflow, recycle, pre_ping, timeout, connect=_connect):
+		self.size = size
+		self.max_overflow = max_overflow
+		self.recycle = recycle
+		self.pre_ping = pre_ping
+		self.timeout = timeout
+		self._connect = connect
+		# LIFO so that the warmest connections are reused first and surplus
+		# connections sit idle long enough to be recycled
+		self._idle = queue.LifoQueue()
+		self._lock = threading.Lock()
+		# Maps id(cnx) -> time connection was opened
+		self._created = {}
+		# Slots claimed by connections currently being opened
+		self._pending = 0
+		self._checked_out = 0
+		self._checkouts = 0
+		self._waits = 0
+		self._wait_time = 0.0
+		self._max_wait_time = 0.0
+		self._timeouts = 0
+
+	def checkout(self, block=True):
+		"""Return a healthy connection, opening a new one if the pool
+		isn't yet at capacity and otherwise blocking or, if not 'block',
+		returning None.
+		"""
+		start = time.perf_counter()
+		cnx = None
+		while cnx is None:
+			try:
+				cnx = self._idle.get_nowait()
+			except queue.Empty:
+				if self._reserve_slot():
+					# Freshly opened connections need no health check
+					cnx = self._open()
+					break
+				if not block:
+					return None
+				try:
+					cnx = self._idle.get(timeout=self.timeout)
+				except queue.Empty:
+					with self._lock:
+						self._timeouts += 1
+					raise TimeoutError('Timed out after {0}s waiting for a DB connection.'.format(self.timeout))
+			cnx = self._validate(cnx)
+		waited = time.perf_counter() - start
+		with self._lock:
+			self._checked_out += 1
+			self._checkouts += 1
+			self._wait_time += waited
+			self._max_wait_time = max(self._max_wait_time, waited)
+			if waited >= 0.001:
+				self._waits += 1
+		return cnx
+
+	def checkin(self, cnx):
+		"""Return a connection to the pool. Any open transaction is rolled
+		back so the next request doesn't inherit its snapshot or locks.
+		"""
+		with self._lock:
+			self._checked_out -= 1
+		try:
+			cnx.rollback()
+		except MySQLError:
+			self._discard(cnx)
+			return
+		# Close overflow connections rather than keeping them idle
+		if self._idle.qsize() >= self.size:
+			self._discard(cnx)
+			return
+		self._idle.put(cnx)
+
+	def stats(self):
+		"""Return counters describing the pool's current state."""
+		with self._lock:
+			return {
+				'size': self.size,
+				'max_overflow': self.max_overflow,
+				'open': len(self._created),
+				'checked_out': self._checked_out,
+				'idle': self._idle.qsize(),
+				'checkouts': self._checkouts,
+				'waits': self._waits,
+				'timeouts': self._timeouts,
+				'total_wait_time': round(self._wait_time, 6),
+				'avg_wait_time': round(self._wait_time / self._checkouts, 6) if self._checkouts else 0.0,
+				'max_wait_time': round(self._max_wait_time, 6)
+			}
+
+	def _reserve_slot(self):
+		"""Claim capacity for a new connection if below size + overflow."""
+		with self._lock:
+			if len(self._created) + self._pending < self.size + self.max_overflow:
+				self._pending += 1
+				return True
+			return False
+
+	def _open(self):
+		"""Open a connection in a reserved slot."""
+		try:
+			cnx = self._connect()
+		except Exception:
+			with self._lock:
+				self._pending -= 1
+			raise
+		with self._lock:
+			self._pending -= 1
+			self._created[id(cnx)] = time.monotonic()
+		return cnx
+
+	def _validate(self, cnx):
+		"""Return cnx if usable, else discard it and return None so that
+		checkout tries again.
+		"""
+		created = self._created.get(id(cnx), 0)
+		if self.recycle >= 0 and time.monotonic() - created > self.recycle:
+			self._discard(cnx)
+			return None
+		if self.pre_ping:
+			try:
+				cnx.ping(reconnect=False)
+			except MySQLError:
+				self._discard(cnx)
+				return None
+		return cnx
+
+	def _discard(self, cnx):
+		"""Close connection and free its slot."""
+		with self._lock:
+			self._created.pop(id(cnx), None)
+		try:
+			cnx.close()
+		except MySQLError:
+			pass
 
 
 def init_app(app):
-	"""In factory function, register the close_db function so
-	that connections closed at end of request.
+	"""In factory function, create the connection pool and register the
+	close_db function so that connections are returned at end of request.
 	"""
+	global _pool, _executor
+	_pool = _make_pool(app.config)
+	_executor = ThreadPoolExecutor(max_workers=app.config['FANOUT_MAX_WORKERS'], thread_name_prefix='fanout')
 	app.teardown_appcontext(close_db)
@@ -1,5 +1,8 @@
-from registhor_app.db import insert_mysql, query_mysql
-from registhor_app.registrations_routes.queries.queries import load_course_codes, load_department_codes
+from collections import defaultdict
+from functools import partial
+from registhor_app.code_index import code_index
+from registhor_app.db import insert_many_mysql, insert_mysql, query_mysql, run_concurrently
+from registhor_app.registrations_routes.queries.queries import load_course_codes
 from registhor_app.utils import _unpack_tuples
 
 
@@ -29,6 +32,30 @@ def add_mandatory_course(department_code, course_code):
 	insert_mysql(statement, (department_code, course_code))
 
 
+def add_mandatory_courses(department_code, course_codes):
+	"""Insert many entries for a department in a single transaction. Courses
+	already marked mandatory are ignored.
+	"""
+	if not _validate_department_code(department_code):
+		raise LookupError('The department code provided is not for an active department.')
+	
+	# Reject whole batch if any course is invalid so nothing partially applied
+	invalid_course_codes = code_index.invalid_course_codes(course_codes)
+	if invalid_course_codes:
+		raise LookupError('The following course codes are not for active courses: {0}'.format(invalid_course_codes))
+	
+	statement = """
+		INSERT IGNORE INTO mandatory_courses (
+			dept_code,
+			course_code
+		) VALUES (
+			%s,
+			%s
+		);
+	"""
+	insert_many_mysql(statement, [(department_code, course_code) for course_code in course_codes])
+
+
 def remove_mandatory_course(department_code, course_code):
 	"""Remove entry from DB if a given department no longer considers a
 	given course as mandatory.
@@ -43,15 +70,26 @@ def remove_mandatory_course(department_code, course_code):
 	insert_mysql(statement, (department_code, course_code))
 
 
+def remove_mandatory_courses(department_code, course_codes):
+	"""Remove many entries for a department in a single transaction."""
+	statement = """
+		DELETE FROM mandatory_courses
+		WHERE
+			dept_code = %s
+		AND
+			course_code = %s;
+	"""
+	insert_many_mysql(statement, [(department_code, course_code) for course_code in course_codes])
+
+
 def load_mandatory_courses(lang, department_code):
 	"""Query all mandatory courses and indicate if the given department
 	considers them mandatory for its employees.
 	"""
-	# Query list of all active courses
-	active_courses = load_course_codes(lang)
-	
-	# Query list of courses marked mandatory by department
-	department_courses = _load_mandatory(department_code)
+	# Query list of all active courses and list of courses marked mandatory
+	# by department concurrently
+	active_courses, department_courses = run_concurrently(partial(load_course_codes, lang),
+														  partial(_load_mandatory, department_code))
 	department_courses = set(_unpack_tuples(department_courses))
 	
 	# Add boolean field 'mandatory' to course dictionaries indicating if department
@@ -62,6 +100,21 @@ def load_mandatory_courses(lang, department_code):
 	return active_courses
 
 
+def load_mandatory_courses_batch(lang, department_codes):
+	"""Return {department_code: courses as 'load_mandatory_courses'} for
+	many departments, reading their mandatory courses in a single query.
+	"""
+	active_courses, department_courses = run_concurrently(partial(load_course_codes, lang),
+														  partial(_load_mandatory_batch, department_codes))
+	mandatory = defaultdict(set)
+	for department_code, course_code in department_courses:
+		mandatory[department_code.upper()].add(course_code)
+	
+	# Copy course dictionaries, which are shared by every department
+	return {department_code: [dict(dict_, mandatory=dict_['course_code'] in mandatory[department_code]) for dict_ in active_courses]
+			for department_code in department_codes}
+
+
 def _load_mandatory(department_code):
 	"""Query list of department's mandatory courses."""
 	query = """
@@ -73,23 +126,25 @@ def _load_mandatory(department_code):
 	return results
 
 
+def _load_mandatory_batch(department_codes):
+	"""Query (department code, course code) of many departments' mandatory
+	courses.
+	"""
+	query = """
+		SELECT dept_code, course_code
+		FROM mandatory_courses
+		WHERE dept_code IN ({0});
+	""".format(', '.join(['%s'] * len(department_codes)))
+	results = query_mysql(query, tuple(department_codes))
+	return results
+
+
 def _validate_course_code(course_code):
 	"""Check if course_code exists in DB."""
-	# Query list of all active courses
-	active_courses = load_course_codes('en')
-	
-	# Convert to set
-	active_course_codes = {dict_['course_code'] for dict_ in active_courses}
-	
-	return True if course_code in active_course_codes else False
+	# Consult shared in-memory index rather than re-scanning the LSR
+	return code_index.is_active_course(course_code)
 
 
 def _validate_department_code(department_code):
 	"""Check if department_code exists in DB."""
-	# Query list of all active departments
-	active_departments = load_department_codes('en')
-	
-	# Convert to set
-	active_department_codes = {dict_['department_code'] for dict_ in active_departments}
-	
-	return True if department_code in active_department_codes else False
+	return code_index.is_active_department(department_code)
@@ -1,7 +1,8 @@
 from flask import Blueprint, request
 from mysql.connector.errors import IntegrityError
 from registhor_app.departments_routes.queries import queries
-from registhor_app.utils import (check_api_key, _invalid_delete,
+from registhor_app.departments_routes.utils import fields
+from registhor_app.utils import (check_api_key, _invalid_args, _invalid_delete,
 	_invalid_post, _missing_args, _valid_delete, _valid_post,
 	_valid_get)
 
@@ -30,6 +31,30 @@ def get_mandatory_courses():
 	return results_processed
 
 
+@departments.route('/api/v1/departments/mandatory-courses/batch', methods=['GET'])
+@check_api_key
+def get_mandatory_courses_batch():
+	"""Return all active courses and whether each of many departments
+	considers them mandatory, keyed by department code.
+	"""
+	# Only allow 'en' and 'fr' to be passed to app
+	lang = 'fr' if request.args.get('lang', None) == 'fr' else 'en'
+	
+	# Comma-separated list e.g. department_codes=CES,DND
+	department_codes = [code.strip().upper() for code in request.args.get('department_codes', '').split(',') if code.strip()]
+	
+	if not department_codes:
+		return _missing_args(missing=['department_codes'])
+	if len(department_codes) > fields.MAX_BATCH_SIZE:
+		return _invalid_args('Too many department_codes; maximum is {0}.'.format(fields.MAX_BATCH_SIZE))
+	
+	# Remove duplicates but keep order
+	department_codes = list(dict.fromkeys(department_codes))
+	results = queries.load_mandatory_courses_batch(lang, department_codes)
+	results_processed = _valid_get(results)
+	return results_processed
+
+
 @departments.route('/api/v1/departments/mandatory-courses', methods=['POST'])
 @check_api_key
 def add_mandatory_course():
@@ -73,3 +98,53 @@ def remove_mandatory_course():
 		return _invalid_delete()
 	else:
 		return _valid_delete()
+
+
+@departments.route('/api/v1/departments/mandatory-courses/bulk', methods=['POST'])
+@check_api_key
+def add_mandatory_courses():
+	"""Mark many courses as mandatory for a department in one transaction."""
+	# Unpack arguments
+	data = request.json
+	department_code = data.get('department_code', None)
+	course_codes = data.get('course_codes', None)
+	
+	if not department_code:
+		return _missing_args(missing=['department_code'])
+	if not course_codes:
+		return _missing_args(missing=['course_codes'])
+	if not isinstance(course_codes, list):
+		return _invalid_args('course_codes must be an array.')
+	
+	try:
+		queries.add_mandatory_courses(department_code, course_codes)
+	except LookupError as e:
+		return _invalid_args(str(e))
+	except Exception as e:
+		return _invalid_post()
+	else:
+		return _valid_post()
+
+
+@departments.route('/api/v1/departments/mandatory-courses/bulk', methods=['DELETE'])
+@check_api_key
+def remove_mandatory_courses():
+	"""Unmark many courses as mandatory for a department in one transaction."""
+	# Unpack arguments
+	data = request.json
+	department_code = data.get('department_code', None)
+	course_codes = data.get('course_codes', None)
+	
+	if not department_code:
+		return _missing_args(missing=['department_code'])
+	if not course_codes:
+		return _missing_args(missing=['course_codes'])
+	if not isinstance(course_codes, list):
+		return _invalid_args('course_codes must be an array.')
+	
+	try:
+		queries.remove_mandatory_courses(department_code, course_codes)
+	except Exception as e:
+		return _invalid_delete()
+	else:
+		return _valid_delete()
@@ -0,0 +1,2 @@
+# Most department codes accepted by the batch route in a single request
+MAX_BATCH_SIZE = 500
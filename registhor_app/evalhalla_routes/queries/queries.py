@@ -1,64 +1,60 @@
-from registhor_app.db import query_mysql
+from functools import partial
+from registhor_app.cache import cached
+from registhor_app.db import query_mysql, run_concurrently
 from registhor_app.utils import _unpack_tuples
 from registhor_app.evalhalla_routes.utils import fields
 
 
+@cached()
 def load_cities(lang):
 	"""Return all cities inputted by learners."""
 	query = """
-		SELECT a.learner_city_{0} AS learner_city, a.learner_province_{0} AS learner_province
-		FROM (
-			SELECT DISTINCT learner_city_{0}, learner_province_{0}
-			FROM lsr_this_year
-			UNION
-			SELECT DISTINCT learner_city_{0}, learner_province_{0}
-			FROM lsr_last_year
-		) AS a;
+		SELECT DISTINCT learner_city_{0} AS learner_city, learner_province_{0} AS learner_province
+		FROM {{table}};
 	""".format(lang)
-	results = query_mysql(query)
+	results = _query_both_years(query)
 	results_processed = _concatenate_city_and_province(results)
 	results_processed = _clean_cities(results_processed)
 	results_processed = _remove_duplicates_and_sort(results_processed)
 	return results_processed
 
 
+@cached()
 def load_classifications():
 	"""Return all classifications inputted by learners."""
 	query = """
-		SELECT a.learner_classif
-		FROM (
-			SELECT DISTINCT learner_classif
-			FROM lsr_this_year
-			UNION
-			SELECT DISTINCT learner_classif
-			FROM lsr_last_year
-		) AS a;
+		SELECT DISTINCT learner_classif
+		FROM {table};
 	"""
-	results = query_mysql(query)
+	results = _query_both_years(query)
 	results_processed = _unpack_tuples(results)
 	results_processed = _remove_duplicates_and_sort(results_processed)
 	return results_processed
 
 
+@cached()
 def load_departments(lang):
 	"""Return all departments inputted by learners."""
 	query = """
-		SELECT a.billing_dept_name_{0}
-		FROM (
-			SELECT DISTINCT billing_dept_name_{0}
-			FROM lsr_this_year
-			UNION
-			SELECT DISTINCT billing_dept_name_{0}
-			FROM lsr_last_year
-		) AS a;
+		SELECT DISTINCT billing_dept_name_{0}
+		FROM {{table}};
 	""".format(lang)
-	results = query_mysql(query)
+	results = _query_both_years(query)
 	results_processed = _unpack_tuples(results)
 	results_processed = _clean_departments(results_processed)
 	results_processed = _remove_duplicates_and_sort(results_processed)
 	return results_processed
 
 
+def _query_both_years(query):
+	"""Run query against 'lsr_this_year' and 'lsr_last_year' concurrently
+	and return the rows of both; callers remove duplicates as UNION would.
+	"""
+	this_year, last_year = run_concurrently(partial(query_mysql, query.format(table='lsr_this_year')),
+											partial(query_mysql, query.format(table='lsr_last_year')))
+	return this_year + last_year
+
+
 def _clean_cities(my_list):
 	"""Remove junk entries."""
 	results_processed = [city for city in my_list if city not in fields.JUNK_CITIES]
@@ -1,6 +1,6 @@
 from flask import Blueprint, request
 from registhor_app.evalhalla_routes.queries import queries
-from registhor_app.utils import check_api_key, _valid_get
+from registhor_app.utils import check_api_key, http_cache, _valid_get
 
 # Instantiate blueprint
 evalhalla = Blueprint('evalhalla', __name__)
@@ -8,6 +8,7 @@ evalhalla = Blueprint('evalhalla', __name__)
 
 @evalhalla.route('/api/v1/evalhalla/cities', methods=['GET'])
 @check_api_key
+@http_cache()
 def cities():
 	# Only allow 'en' and 'fr' to be passed to app
 	lang = 'fr' if request.args.get('lang', None) == 'fr' else 'en'
@@ -20,6 +21,7 @@ def cities():
 
 @evalhalla.route('/api/v1/evalhalla/classifications', methods=['GET'])
 @check_api_key
+@http_cache()
 def classifications():
 	# Run query and return as JSON
 	results = queries.load_classifications()
@@ -29,6 +31,7 @@ def classifications():
 
 @evalhalla.route('/api/v1/evalhalla/departments', methods=['GET'])
 @check_api_key
+@http_cache()
 def departments():
 	# Only allow 'en' and 'fr' to be passed to app
 	lang = 'fr' if request.args.get('lang', None) == 'fr' else 'en'
@@ -0,0 +1,99 @@
+import csv
+import io
+import re
+from flask import Response, stream_with_context
+from registhor_app.utils import _dumps
+
+# pyarrow is optional; only needed for Parquet exports
+try:
+	import pyarrow
+	import pyarrow.parquet
+except ImportError:
+	pyarrow = None
+
+EXPORT_MIMETYPES = {
+	'csv': 'text/csv',
+	'ndjson': 'application/x-ndjson',
+	'parquet': 'application/vnd.apache.parquet'
+}
+
+
+def export_formats():
+	"""Return formats that can be exported with the installed packages."""
+	return [format_ for format_ in EXPORT_MIMETYPES if format_ != 'parquet' or pyarrow is not None]
+
+
+def _valid_export(batches, columns, format_, filename):
+	"""Stream batches of row tuples as a file download in CSV, NDJSON or
+	Parquet. 'columns' is a list of (name, type) where type is a Parquet
+	type alias e.g. 'string', 'int64' or 'double'. Each batch is encoded and
+	sent as soon as it's fetched so memory use doesn't grow with the size of
+	the export.
+	"""
+	generators = {'csv': _generate_csv, 'ndjson': _generate_ndjson, 'parquet': _generate_parquet}
+	response = Response(stream_with_context(generators[format_](batches, columns)), mimetype=EXPORT_MIMETYPES[format_])
+	# Filename is built from args so keep only characters safe in a header
+	filename = re.sub(r'[^A-Za-z0-9_.-]', '_', filename)
+	response.headers['Content-Disposition'] = 'attachment; filename="{0}.{1}"'.format(filename, format_)
+	return response, 200
+
+
+def _generate_csv(batches, columns):
+	buffer = io.StringIO()
+	writer = csv.writer(buffer)
+	writer.writerow([name for name, _ in columns])
+	for batch in batches:
+		writer.writerows(batch)
+		yield buffer.getvalue()
+		buffer.seek(0)
+		buffer.truncate()
+	# Header alone if no rows
+	if buffer.tell():
+		yield buffer.getvalue()
+
+
+def _generate_ndjson(batches, columns):
+	names = [name for name, _ in columns]
+	for batch in batches:
+		yield ''.join(_dumps(dict(zip(names, row))) + '\n' for row in batch)
+
+
+def _generate_parquet(batches, columns):
+	"""Write each batch as a row group and yield the bytes written so far;
+	the footer is written, and yielded, on close.
+	"""
+	schema = pyarrow.schema([(name, pyarrow.type_for_alias(type_)) for name, type_ in columns])
+	sink = _ChunkSink()
+	writer = pyarrow.parquet.ParquetWriter(sink, schema)
+	for batch in batches:
+		if not batch:
+			continue
+		arrays = [pyarrow.array([row[i] for row in batch], type=field.type) for i, field in enumerate(schema)]
+		writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+		yield sink.drain()
+	writer.close()
+	yield sink.drain()
+
+
+class _ChunkSink(io.RawIOBase):
+	"""Write-only file that hands over what's been written on 'drain'."""
+
+	def __init__(self):
+		self._chunks = []
+		self._position = 0
+
+	def writable(self):
+		return True
+
+	def write(self, b):
+		self._chunks.append(bytes(b))
+		self._position += len(b)
+		return len(b)
+
+	def tell(self):
+		return self._position
+
+	def drain(self):
+		data = b''.join(self._chunks)
+		self._chunks = []
+		return data
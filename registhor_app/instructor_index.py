@@ -0,0 +1,132 @@
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from registhor_app.config import Config
+from registhor_app.db import query_mysql
+from registhor_app.snapshot import Snapshot
+from registhor_app.utils import _fold
+
+# Column 'instructor_names' may hold several names
+NAME_SEPARATORS = re.compile(r'[,;/]')
+
+
+class InstructorIndex(Snapshot):
+	"""Instructor names of every offering, indexed two ways: a sorted list
+	of names and of each word onwards in them (e.g. 'paula smith' and
+	'smith') for typeahead prefix search, and trigrams of each offering's
+	'instructor_names' to resolve the substring filter 'instructor_name'
+	without a leading-wildcard LIKE scanning the table. Matching ignores
+	case and accents, as MySQL's default collation does. Reloaded only if the
+	table's checksum has changed since the last load.
+	"""
+
+	def search(self, prefix, limit):
+		"""Return up to 'limit' instructors with a name, or a word in it,
+		starting with 'prefix', most offerings first.
+		"""
+		data = self.get()
+		key = _fold(prefix).strip()
+		if not key:
+			return []
+		counts = {}
+		i = bisect_left(data.prefix_keys, key)
+		while i < len(data.prefix_keys) and data.prefix_keys[i].startswith(key):
+			name = data.prefix_names[i]
+			counts[name] = data.name_counts[name]
+			i += 1
+		matches = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+		return [{'instructor_name': name, 'offering_count': count} for name, count in matches]
+
+	def offering_ids(self, substring):
+		"""Return sorted IDs of offerings whose 'instructor_names' contains
+		'substring', or None if it's too short to look up by trigram or
+		contains LIKE wildcards.
+		"""
+		key = _fold(substring)
+		if len(key) < 3 or '%' in key or '_' in key:
+			return None
+		data = self.get()
+		postings = []
+		for trigram in _trigrams(key):
+			positions = data.trigrams.get(trigram, None)
+			if positions is None:
+				return []
+			postings.append(positions)
+		postings.sort(key=len)
+		candidates = set(postings[0])
+		for positions in postings[1:]:
+			candidates.intersection_update(positions)
+			if not candidates:
+				return []
+		# Trigrams can match out of order so check candidates contain key
+		return [data.ids[position] for position in sorted(candidates) if key in data.texts[position]]
+
+	def stats(self):
+		results = super().stats()
+		if self._data is not None:
+			results['offerings'] = len(self._data.ids)
+			results['instructors'] = len(self._data.name_counts)
+		return results
+
+	def _load(self):
+		query = """
+			SELECT offering_id, instructor_names
+			FROM offerings
+			WHERE instructor_names IS NOT NULL AND instructor_names != ''
+			ORDER BY offering_id ASC;
+		"""
+		return _InstructorIndexData(query_mysql(query))
+
+	def _source_version(self):
+		# Returns [('registhor.offerings', checksum)]
+		results = query_mysql('CHECKSUM TABLE offerings;')
+		return results[0][1] if results else None
+
+
+class _InstructorIndexData:
+	"""Built indexes of 'InstructorIndex'; swapped whole on reload."""
+	__slots__ = ('ids', 'texts', 'trigrams', 'name_counts', 'prefix_keys', 'prefix_names')
+
+	def __init__(self, results):
+		self.ids = []
+		self.texts = []
+		trigrams = defaultdict(list)
+		# Maps folded name -> {spelling: offerings}, so names differing only by
+		# case or accents are suggested once, as their most common spelling
+		spellings = defaultdict(lambda: defaultdict(int))
+		for offering_id, instructor_names in results:
+			position = len(self.ids)
+			text = _fold(instructor_names)
+			self.ids.append(offering_id)
+			self.texts.append(text)
+			for trigram in set(_trigrams(text)):
+				trigrams[trigram].append(position)
+			for key, name in {_fold(name): name for name in _split_names(instructor_names)}.items():
+				spellings[key][name] += 1
+		self.trigrams = dict(trigrams)
+		names = {key: max(counts.items(), key=lambda item: (item[1], item[0]))[0] for key, counts in spellings.items()}
+		self.name_counts = {names[key]: sum(counts.values()) for key, counts in spellings.items()}
+		prefixes = sorted((' '.join(words[i:]), name)
+						  for key, name in names.items()
+						  for words in (key.split(),)
+						  for i in range(len(words)))
+		self.prefix_keys = [key for key, _ in prefixes]
+		self.prefix_names = [name for _, name in prefixes]
+
+
+def _split_names(instructor_names):
+	"""Split 'instructor_names' into individual names, whitespace collapsed."""
+	names = (' '.join(name.split()) for name in NAME_SEPARATORS.split(instructor_names))
+	return [name for name in names if name]
+
+
+def _trigrams(text):
+	return [text[i:i + 3] for i in range(len(text) - 2)]
+
+
+instructor_index = InstructorIndex('instructor_index', Config.INSTRUCTOR_INDEX_REFRESH_INTERVAL)
+
+
+def init_app(app):
+	"""In factory function, apply the configured refresh interval."""
+	instructor_index.refresh_interval = app.config['INSTRUCTOR_INDEX_REFRESH_INTERVAL']
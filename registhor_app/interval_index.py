@@ -0,0 +1,95 @@
+import datetime
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from registhor_app.config import Config
+from registhor_app.db import query_mysql
+from registhor_app.snapshot import Snapshot
+
+
+class IntervalIndex:
+	"""Static index of closed date intervals answering which overlap a query
+	range [date_1, date_2], i.e. start <= date_2 and end >= date_1.
+
+	A B-tree on (start_date, end_date) can only seek on start so must scan
+	every interval that started before date_2. Here intervals are grouped
+	into classes by length (0, 1, 2-3, 4-7, ... days), each sorted by start.
+	An interval in a class whose longest member is L days can only overlap
+	if it starts in [date_1 - L, date_2], so each class is bisected to that
+	range and only the few candidates there have their end checked.
+	"""
+
+	def __init__(self, starts, ends):
+		classes = defaultdict(list)
+		for position, (start, end) in enumerate(zip(starts, ends)):
+			start, end = start.toordinal(), end.toordinal()
+			classes[max(end - start, 0).bit_length()].append((start, end, position))
+		self._classes = []
+		for members in classes.values():
+			members.sort()
+			self._classes.append((max(max(end - start, 0) for start, end, _ in members),
+								  [start for start, _, _ in members],
+								  [end for _, end, _ in members],
+								  [position for _, _, position in members]))
+		self._size = len(starts)
+
+	def __len__(self):
+		return self._size
+
+	def overlapping(self, date_1, date_2):
+		"""Return sorted positions, in the lists passed to the constructor, of
+		intervals overlapping [date_1, date_2].
+		"""
+		low, high = date_1.toordinal(), date_2.toordinal()
+		results = []
+		for longest, starts, ends, positions in self._classes:
+			first = bisect_left(starts, low - longest)
+			last = bisect_right(starts, high)
+			results.extend(positions[i] for i in range(first, last) if ends[i] >= low)
+		results.sort()
+		return results
+
+
+class OfferingIntervalIndex(Snapshot):
+	"""Dates of every offering, so calendar queries can look up the IDs of
+	offerings overlapping a range and fetch only those rows by primary key.
+	Reloaded only if the table's checksum has changed since the last load.
+	"""
+
+	def overlapping_ids(self, date_1, date_2):
+		"""Return sorted IDs of offerings overlapping [date_1, date_2]. Raise
+		ValueError if a date is malformed.
+		"""
+		date_1 = datetime.date.fromisoformat(date_1)
+		date_2 = datetime.date.fromisoformat(date_2)
+		ids, index = self.get()
+		return [ids[position] for position in index.overlapping(date_1, date_2)]
+
+	def stats(self):
+		results = super().stats()
+		if self._data is not None:
+			results['offerings'] = len(self._data[1])
+		return results
+
+	def _load(self):
+		query = """
+			SELECT offering_id, start_date, end_date
+			FROM offerings
+			WHERE start_date IS NOT NULL AND end_date IS NOT NULL;
+		"""
+		results = query_mysql(query)
+		ids = [offering_id for offering_id, _, _ in results]
+		index = IntervalIndex([start_date for _, start_date, _ in results], [end_date for _, _, end_date in results])
+		return ids, index
+
+	def _source_version(self):
+		# Returns [('registhor.offerings', checksum)]
+		results = query_mysql('CHECKSUM TABLE offerings;')
+		return results[0][1] if results else None
+
+
+offering_interval_index = OfferingIntervalIndex('offering_interval_index', Config.INTERVAL_INDEX_REFRESH_INTERVAL)
+
+
+def init_app(app):
+	"""In factory function, apply the configured refresh interval."""
+	offering_interval_index.refresh_interval = app.config['INTERVAL_INDEX_REFRESH_INTERVAL']
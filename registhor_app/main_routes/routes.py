@@ -1,4 +1,10 @@
-from flask import Blueprint, render_template
+from flask import Blueprint, Response, render_template
+from registhor_app.cache import cache_stats, invalidate
+from registhor_app.comments_routes.queries.queries import format_cache_stats
+from registhor_app.db import pool_stats
+from registhor_app.snapshot import invalidate_all, snapshot_stats
+from registhor_app.timing import metrics_text
+from registhor_app.utils import check_api_key, _valid_delete, _valid_get
 
 # Instantiate blueprint
 main = Blueprint('main', __name__)
@@ -17,3 +23,45 @@ def index_en():
 @main.route('/fr', methods=['GET'])
 def index_fr():
 	return render_template('index_en.html')
+
+
+@main.route('/api/v1/status/db-pool', methods=['GET'])
+@check_api_key
+def db_pool():
+	"""Return this worker's DB connection pool counters for monitoring."""
+	results = pool_stats()
+	results_processed = _valid_get(results)
+	return results_processed
+
+
+@main.route('/api/v1/status/cache', methods=['GET'])
+@check_api_key
+def cache():
+	"""Return query result cache and comment formatter hit/miss counters
+	and the version and age of in-memory snapshots.
+	"""
+	results = cache_stats()
+	results['snapshots'] = snapshot_stats()
+	results['formatters'] = format_cache_stats()
+	results_processed = _valid_get(results)
+	return results_processed
+
+
+@main.route('/api/v1/status/cache', methods=['DELETE'])
+@check_api_key
+def clear_cache():
+	"""Drop all cached query results and reload snapshots e.g. after the
+	nightly data load.
+	"""
+	invalidate()
+	invalidate_all()
+	return _valid_delete()
+
+
+@main.route('/metrics', methods=['GET'])
+@check_api_key
+def metrics():
+	"""Return this worker's request and stage timings in Prometheus text
+	format.
+	"""
+	return Response(metrics_text(), mimetype='text/plain; version=0.0.4')
@@ -1,100 +1,221 @@
-from registhor_app.db import query_mysql
-from registhor_app.utils import (_combine_overlapping_cities_hashed, _dict_decimal_to_float,
-	_dict_remove_none, _dict_fix_dates, _dict_assign_background_color, _dict_fix_lang)
+from flask import current_app
+from registhor_app import aio_db
+from registhor_app.clustering import cluster_markers
+from registhor_app.db import query_mysql, stream_mysql
+from registhor_app.instructor_index import instructor_index
+from registhor_app.interval_index import offering_interval_index
+from registhor_app.query_builder import QueryTemplate
+from registhor_app.rollups import offering_city_rollup
+from registhor_app.utils import _dict_decimal_to_float, _dict_remove_none, _process_offerings
+
+# Offering overlaps [date_1, date_2] iff it starts on or before date_2 and ends
+# on or after date_1; unlike an OR of BETWEENs this can use an index on
+# (start_date, end_date). Optional filters are only emitted when supplied.
+# When the interval index has resolved the overlapping offerings, they're
+# also fetched by primary key; the date predicates are kept so an offering
+# whose dates changed since the index was loaded isn't returned. The index
+# reloads when the table changes, checked every INTERVAL_INDEX_REFRESH_INTERVAL
+# seconds, so offerings added or re-dated in between may be missed until then;
+# likewise for the instructor index and offerings' instructors.
+OFFERING_INFO_QUERY = QueryTemplate("""
+	SELECT a.offering_id, a.course_title_{lang} AS course_title, a.course_code, a.instructor_names,
+		a.confirmed_count, a.cancelled_count, a.waitlisted_count, a.no_show_count, a.business_type,
+		a.event_description, a.start_date, a.end_date, c.business_line_{lang} AS business_line,
+		a.client AS client_dept_code, b.dept_name_{lang} AS client_dept_name, a.offering_status,
+		a.offering_language, a.offering_region_{lang} AS offering_region, a.offering_province_{lang} AS offering_province,
+		a.offering_city_{lang} AS offering_city, a.offering_lat, a.offering_lng
+	FROM offerings AS a
+	LEFT OUTER JOIN departments AS b
+	ON a.client = b.dept_code
+	LEFT OUTER JOIN product_info AS c
+	ON a.course_code = c.course_code
+	WHERE
+		a.start_date <= %s
+		AND a.end_date >= %s
+		AND a.offering_status IN (%s, %s, %s){filters}
+	ORDER BY IFNULL(a.offering_city_{lang}, '') ASC, a.course_code ASC, a.offering_id ASC
+	LIMIT %s OFFSET %s;
+""")
+
+# GROUP BY city name as well as latitude and longitude in case cities in
+# different provinces share same name
+OFFERING_COUNTS_QUERY = QueryTemplate("""
+	SELECT a.offering_city_{lang} AS offering_city, a.offering_lat, a.offering_lng, COUNT(a.offering_id) AS count
+	FROM offerings AS a
+	LEFT OUTER JOIN product_info AS c
+	ON a.course_code = c.course_code
+	WHERE
+		a.start_date <= %s
+		AND a.end_date >= %s
+		AND a.offering_status IN (%s, %s, %s){filters}
+	GROUP BY 1, 2, 3;
+""")
 
 
 def load_offering_info(date_1, date_2, offering_status, course_code, instructor_name, business_line, clients_only, limit, offset, lang):
 	"""Return info for all offerings matching user criteria."""
-	# Add percent signs to var 'instructor_name' for LIKE statement
-	instructor_name = '{0}{1}{0}'.format('%', instructor_name)
-	
-	# Add clause to see only client requests
-	clients_only = "AND (a.client != '')" if clients_only == 'true' else ''
-	
-	query = """
-		SELECT a.offering_id, a.course_title_{0} AS course_title, a.course_code, a.instructor_names,
-			a.confirmed_count, a.cancelled_count, a.waitlisted_count, a.no_show_count, a.business_type,
-			a.event_description, a.start_date, a.end_date, c.business_line_{0} AS business_line,
-			a.client AS client_dept_code, b.dept_name_{0} AS client_dept_name, a.offering_status,
-			a.offering_language, a.offering_region_{0} AS offering_region, a.offering_province_{0} AS offering_province,
-			a.offering_city_{0} AS offering_city, a.offering_lat, a.offering_lng
-		FROM offerings AS a
-		LEFT OUTER JOIN departments AS b
-		ON a.client = b.dept_code
-		LEFT OUTER JOIN product_info AS c
-		ON a.course_code = c.course_code
-		WHERE
-			(
-				(a.start_date BETWEEN %s AND %s)
-				OR
-				(a.end_date BETWEEN %s AND %s)
-				OR
-				(a.start_date <= %s AND a.end_date >= %s)
-			)
-			AND a.offering_status IN (%s, %s, %s)
-			AND (a.course_code = %s OR %s = '')
-			AND (a.instructor_names LIKE %s OR %s = '%%')
-			AND (c.business_line_{0} = %s OR %s = '')
-			{1}
-		ORDER BY 20 ASC, 3 ASC
-		LIMIT %s OFFSET %s;
-	""".format(lang, clients_only)
-	results = query_mysql(query, (date_1, date_2, date_1, date_2, date_1, date_2, offering_status[0], offering_status[1],
-								  offering_status[2], course_code, course_code, instructor_name,
-								  instructor_name, business_line, business_line, int(limit), int(offset)), dict_=True)
-	# Cast any values of dtype 'Decimal' to float so can be JSONified
-	results_processed = [_dict_decimal_to_float(my_dict) for my_dict in results]
-	# Replace 'None' with empty string for consistency
-	results_processed = [_dict_remove_none(my_dict) for my_dict in results]
-	# Fix date formats = use standard ISO format
-	results_processed = [_dict_fix_dates(my_dict) for my_dict in results]
-	# Add background colours
+	ids = _indexed_ids(date_1, date_2, instructor_name)
+	query, args = _offering_info_query(date_1, date_2, offering_status, course_code, instructor_name, business_line, clients_only, limit, offset, lang, ids=ids)
+	results = query_mysql(query, args, dict_=True)
+	# Cast Decimals to float, replace 'None' with empty string, use ISO dates,
+	# add background colours and fix French edge cases in a single pass
 	# Processing Python-side for consistency as dates as implementation-specific in JS
-	results_processed = [_dict_assign_background_color(my_dict) for my_dict in results]
-	# Fix French edge cases
-	results_processed = [_dict_fix_lang(my_dict, lang) for my_dict in results]
+	results_processed = _process_offerings(results, lang)
+	return results_processed
+
+
+def load_offering_info_page(date_1, date_2, offering_status, course_code, instructor_name, business_line, clients_only, limit, after, lang):
+	"""Return a page of offerings following sort key 'after' (keyset
+	pagination) and the sort key of the page's last row, or None if there
+	are no further pages. Pass an empty 'after' for the first page.
+	"""
+	ids = _indexed_ids(date_1, date_2, instructor_name)
+	query, args = _offering_info_query(date_1, date_2, offering_status, course_code, instructor_name, business_line, clients_only, limit, 0, lang, after, ids)
+	results = query_mysql(query, args, dict_=True)
+	results_processed = _process_offerings(results, lang)
+	return results_processed, _next_key(results_processed, limit)
+
+
+async def load_offering_info_async(date_1, date_2, offering_status, course_code, instructor_name, business_line, clients_only, limit, offset, lang):
+	"""As 'load_offering_info' but awaiting the query on the async pool."""
+	query, args = _offering_info_query(date_1, date_2, offering_status, course_code, instructor_name, business_line, clients_only, limit, offset, lang)
+	results = await aio_db.query_mysql(query, args, dict_=True)
+	results_processed = _process_offerings(results, lang)
 	return results_processed
 
 
-def load_offering_counts(date_1, date_2, offering_status, course_code, instructor_name, business_line, clients_only, lang):
+async def load_offering_info_page_async(date_1, date_2, offering_status, course_code, instructor_name, business_line, clients_only, limit, after, lang):
+	"""As 'load_offering_info_page' but awaiting the query on the async pool."""
+	query, args = _offering_info_query(date_1, date_2, offering_status, course_code, instructor_name, business_line, clients_only, limit, 0, lang, after)
+	results = await aio_db.query_mysql(query, args, dict_=True)
+	results_processed = _process_offerings(results, lang)
+	return results_processed, _next_key(results_processed, limit)
+
+
+def _next_key(results_processed, limit):
+	"""Return sort key of a page's last row, or None if it's the last page."""
+	# Key = (offering_city, course_code, offering_id); 'None' cities already replaced with ''
+	last = results_processed[-1] if results_processed and len(results_processed) == int(limit) else None
+	return [last['offering_city'], last['course_code'], last['offering_id']] if last is not None else None
+
+
+def stream_offering_info(date_1, date_2, offering_status, course_code, instructor_name, business_line, clients_only, limit, offset, lang, batch_size):
+	"""Yield info for all offerings matching user criteria in batches of
+	processed rows.
+	"""
+	ids = _indexed_ids(date_1, date_2, instructor_name)
+	query, args = _offering_info_query(date_1, date_2, offering_status, course_code, instructor_name, business_line, clients_only, limit, offset, lang, ids=ids)
+	for results in stream_mysql(query, args, dict_=True, batch_size=batch_size):
+		yield _process_offerings(results, lang)
+
+
+def _offering_info_query(date_1, date_2, offering_status, course_code, instructor_name, business_line, clients_only, limit, offset, lang, after=None, ids=None):
+	"""Return SQL and args for 'load_offering_info', 'load_offering_info_page'
+	and 'stream_offering_info'. If 'after' isn't None, seek past sort key
+	'after' instead of using OFFSET. If 'ids' isn't None, fetch only those
+	offerings.
+	"""
+	filters = _offering_filters(course_code, instructor_name, business_line, clients_only, ids)
+	# Keyset pagination; IFNULL so that offerings without a city can be sought past
+	seek = (after[0], after[0], after[1], after[1], after[2]) if after else None
+	filters.append(("(IFNULL(a.offering_city_{lang}, '') > %s OR (IFNULL(a.offering_city_{lang}, '') = %s "
+					"AND (a.course_code > %s OR (a.course_code = %s AND a.offering_id > %s))))", seek))
+	query, args = OFFERING_INFO_QUERY.render(filters, lang=lang)
+	args = (date_2, date_1) + tuple(offering_status) + args + (int(limit), int(offset))
+	return query, args
+
+
+def search_instructors(prefix, limit):
+	"""Return instructors whose name, or a word in it, starts with 'prefix'."""
+	return instructor_index.search(prefix, limit)
+
+
+def load_offering_counts(date_1, date_2, offering_status, course_code, instructor_name, business_line, clients_only, lang, zoom=None):
 	"""Return counts by city for all offerings matching user criteria."""
-	# Add percent signs to var 'instructor_name' for LIKE statement
-	instructor_name = '{0}{1}{0}'.format('%', instructor_name)
+	# Serve from in-memory rollup unless filtering on instructors, which
+	# the rollup doesn't track
+	if current_app.config['ROLLUPS_ENABLED'] and not instructor_name:
+		try:
+			return offering_city_rollup.counts_by_city(date_1, date_2, offering_status, course_code, business_line, clients_only, lang, zoom)
+		# If dates malformed, let MySQL decide as before
+		except ValueError:
+			pass
 	
-	# Add clause to see only client requests
-	clients_only = "AND (a.client != '')" if clients_only == 'true' else ''
-	
-	# GROUP BY city name as well as latitude and longitude in case cities in
-	# different provinces share same name
-	# ORDER BY COUNT() DESC so that the largest cities appear and are logged first in func '_combine_overlapping_cities_hashed'
-	query = """
-		SELECT a.offering_city_{0} AS offering_city, a.offering_lat, a.offering_lng, COUNT(a.offering_id) AS count
-		FROM offerings AS a
-		LEFT OUTER JOIN product_info AS c
-		ON a.course_code = c.course_code
-		WHERE
-			(
-				(a.start_date BETWEEN %s AND %s)
-				OR
-				(a.end_date BETWEEN %s AND %s)
-				OR
-				(a.start_date <= %s AND a.end_date >= %s)
-			)
-			AND a.offering_status IN (%s, %s, %s)
-			AND (a.course_code = %s OR %s = '')
-			AND (a.instructor_names LIKE %s OR %s = '%%')
-			AND (c.business_line_{0} = %s OR %s = '')
-			{1}
-		GROUP BY 1, 2, 3
-		ORDER BY 4 DESC;
-	""".format(lang, clients_only)
-	results = query_mysql(query, (date_1, date_2, date_1, date_2, date_1, date_2, offering_status[0], offering_status[1],
-								  offering_status[2], course_code, course_code, instructor_name,
-								  instructor_name, business_line, business_line), dict_=True)
+	ids = _indexed_ids(date_1, date_2, instructor_name)
+	query, args = _offering_counts_query(date_1, date_2, offering_status, course_code, instructor_name, business_line, clients_only, lang, ids)
+	results = query_mysql(query, args, dict_=True)
+	return _process_counts(results, zoom)
+
+
+async def load_offering_counts_async(date_1, date_2, offering_status, course_code, instructor_name, business_line, clients_only, lang, zoom=None):
+	"""As 'load_offering_counts' but always querying the DB, awaiting the
+	query on the async pool.
+	"""
+	query, args = _offering_counts_query(date_1, date_2, offering_status, course_code, instructor_name, business_line, clients_only, lang)
+	results = await aio_db.query_mysql(query, args, dict_=True)
+	return _process_counts(results, zoom)
+
+
+def _offering_counts_query(date_1, date_2, offering_status, course_code, instructor_name, business_line, clients_only, lang, ids=None):
+	"""Return SQL and args for 'load_offering_counts'."""
+	filters = _offering_filters(course_code, instructor_name, business_line, clients_only, ids)
+	query, args = OFFERING_COUNTS_QUERY.render(filters, lang=lang)
+	return query, (date_2, date_1) + tuple(offering_status) + args
+
+
+def _process_counts(results, zoom):
+	"""Prepare city counts for JSON and combine nearby cities."""
 	# Cast any values of dtype 'Decimal' to float so can be JSONified
 	results_processed = [_dict_decimal_to_float(my_dict) for my_dict in results]
 	# Replace 'None' with empty string for consistency
 	results_processed = [_dict_remove_none(my_dict) for my_dict in results]
 	# Combine nearby cities to avoid clogging map e.g. Kanata, Vanier -> Ottawa
-	results_processed = _combine_overlapping_cities_hashed(results_processed)
+	results_processed = cluster_markers(results_processed, zoom)
 	return results_processed
+
+
+def _indexed_ids(date_1, date_2, instructor_name):
+	"""Return IDs of offerings overlapping [date_1, date_2] and, if passed,
+	taught by 'instructor_name', from the interval and instructor indexes as
+	a tuple padded by '_pad_ids'. Return None to rely on the SQL predicates
+	alone: if neither index applies, too many offerings match for an IN
+	list to beat scanning, or none do, as offerings added since the indexes
+	were loaded may.
+	"""
+	config = current_app.config
+	ids = None
+	if config['INTERVAL_INDEX_ENABLED']:
+		try:
+			ids = offering_interval_index.overlapping_ids(date_1, date_2)
+		# If dates malformed, let MySQL decide as before
+		except ValueError:
+			pass
+	if instructor_name and config['INSTRUCTOR_INDEX_ENABLED']:
+		instructor_ids = instructor_index.offering_ids(instructor_name)
+		if instructor_ids is not None:
+			ids = instructor_ids if ids is None else sorted(set(ids).intersection(instructor_ids))
+	if not ids or len(ids) > config['INDEX_MAX_IDS']:
+		return None
+	return _pad_ids(ids)
+
+
+def _pad_ids(ids):
+	"""Repeat the last ID until there's a power of two of them so that
+	QueryTemplate caches a handful of IN lists rather than one per length.
+	"""
+	size = 1 << (len(ids) - 1).bit_length()
+	return tuple(ids) + (ids[-1],) * (size - len(ids))
+
+
+def _offering_filters(course_code, instructor_name, business_line, clients_only, ids=None):
+	"""Return optional filters shared by offering queries for QueryTemplate."""
+	return [
+		('a.offering_id IN ({0})'.format(', '.join(['%s'] * len(ids or ()))), ids),
+		('a.course_code = %s', course_code),
+		# Add percent signs to var 'instructor_name' for LIKE statement; kept
+		# when resolved through the instructor index, which folds accents
+		('a.instructor_names LIKE %s', '{0}{1}{0}'.format('%', instructor_name) if instructor_name else ''),
+		('c.business_line_{lang} = %s', business_line),
+		# Add clause to see only client requests
+		("a.client != ''", 'true' if clients_only == 'true' else '')
+	]
@@ -1,38 +1,26 @@
-from flask import Blueprint, request
+from flask import Blueprint, current_app, request
+from registhor_app.clustering import parse_zoom
 from registhor_app.offerings_routes.queries import queries
-from registhor_app.utils import (check_api_key, _invalid_args, _missing_args,
-	_valid_get)
+from registhor_app.utils import (check_api_key, http_cache, _decode_cursor, _encode_cursor,
+	_invalid_args, _missing_args, _stream_mode, _valid_get, _valid_get_page,
+	_valid_get_stream)
 
 # Instantiate blueprint
 offerings = Blueprint('offerings', __name__)
 
+# Most suggestions the typeahead route will return
+MAX_INSTRUCTOR_RESULTS = 50
+
 
 @offerings.route('/api/v1/offerings/offering-information', methods=['GET'])
 @check_api_key
 def offering_info():
-	# Only allow 'en' and 'fr' to be passed to app
-	lang = 'fr' if request.args.get('lang', None) == 'fr' else 'en'
-	
-	# User must pass at least date_1
-	date_1 = request.args.get('date_1', None)
-	if not date_1:
+	params = offering_args(request.args)
+	if params is None:
 		return _missing_args(missing=['date_1'])
+	(date_1, date_2, offering_status, course_code, instructor_name,
+	 business_line, clients_only, lang) = params
 	
-	# If date_2 not specified, simply assume a 1-day range
-	date_2 = request.args.get('date_2', None)
-	if not date_2:
-		date_2 = date_1
-	
-	# If exclude_cancelled is true, exclude 'Cancelled - Normal' from
-	# permitted values for offering_status
-	exclude_cancelled = request.args.get('exclude_cancelled', 'false')
-	offering_status = ['Delivered - Normal', 'Open - Normal', 'Open - Normal'] if exclude_cancelled == 'true' else ['Cancelled - Normal', 'Delivered - Normal', 'Open - Normal']
-	
-	# Optional
-	course_code = request.args.get('course_code', '').upper()
-	instructor_name = request.args.get('instructor_name', '')
-	business_line = request.args.get('business_line', '')
-	clients_only = request.args.get('clients_only', 'false')
 	limit = request.args.get('limit', '999999')
 	offset = request.args.get('offset', '0')
 	
@@ -40,6 +28,25 @@ def offering_info():
 	if not limit.isdigit() or not offset.isdigit():
 		return _invalid_args('Invalid limit and/or offset.')
 	
+	# If 'cursor' passed (empty for first page), use keyset pagination
+	cursor = request.args.get('cursor', None)
+	if cursor is not None:
+		try:
+			after = _decode_cursor(cursor, 3)
+		except ValueError as e:
+			return _invalid_args(str(e))
+		results, next_key = queries.load_offering_info_page(date_1, date_2, offering_status, course_code, instructor_name,
+															business_line, clients_only, limit, after, lang)
+		next_cursor = _encode_cursor(next_key) if next_key is not None else None
+		return _valid_get_page(results, next_cursor)
+	
+	# If requested, stream rows as they're fetched to cap memory use
+	stream = _stream_mode()
+	if stream:
+		batches = queries.stream_offering_info(date_1, date_2, offering_status, course_code, instructor_name, business_line,
+											   clients_only, limit, offset, lang, current_app.config['STREAM_BATCH_SIZE'])
+		return _valid_get_stream(batches, ndjson=(stream == 'ndjson'))
+	
 	# Run query and return as JSON
 	results = queries.load_offering_info(date_1, date_2, offering_status, course_code, instructor_name, business_line, clients_only, limit, offset, lang)
 	results_processed = _valid_get(results)
@@ -49,31 +56,70 @@ def offering_info():
 @offerings.route('/api/v1/offerings/counts-by-city', methods=['GET'])
 @check_api_key
 def offering_counts():
+	params = offering_args(request.args)
+	if params is None:
+		return _missing_args(missing=['date_1'])
+	(date_1, date_2, offering_status, course_code, instructor_name,
+	 business_line, clients_only, lang) = params
+	
+	# Map zoom level determines how far apart markers must be to not be combined
+	try:
+		zoom = parse_zoom(request.args.get('zoom', None))
+	except ValueError as e:
+		return _invalid_args(str(e))
+	
+	# Run query and return as JSON
+	results = queries.load_offering_counts(date_1, date_2, offering_status, course_code, instructor_name, business_line, clients_only, lang, zoom)
+	results_processed = _valid_get(results)
+	return results_processed
+
+
+@offerings.route('/api/v1/offerings/instructors', methods=['GET'])
+@check_api_key
+@http_cache()
+def instructors():
+	"""Typeahead: return instructors whose name, or a word in it, starts
+	with 'q'.
+	"""
+	prefix = request.args.get('q', '')
+	if not prefix.strip():
+		return _missing_args(missing=['q'])
+	
+	limit = request.args.get('limit', '10')
+	if not limit.isdigit() or not 0 < int(limit) <= MAX_INSTRUCTOR_RESULTS:
+		return _invalid_args('Invalid limit; maximum is {0}.'.format(MAX_INSTRUCTOR_RESULTS))
+	
+	results = queries.search_instructors(prefix, int(limit))
+	results_processed = _valid_get(results)
+	return results_processed
+
+
+def offering_args(args):
+	"""Unpack args shared by offering routes from a query string mapping.
+	Return (date_1, date_2, offering_status, course_code, instructor_name,
+	business_line, clients_only, lang), or None if date_1 is missing.
+	"""
 	# Only allow 'en' and 'fr' to be passed to app
-	lang = 'fr' if request.args.get('lang', None) == 'fr' else 'en'
+	lang = 'fr' if args.get('lang', None) == 'fr' else 'en'
 	
 	# User must pass at least date_1
-	date_1 = request.args.get('date_1', None)
+	date_1 = args.get('date_1', None)
 	if not date_1:
-		return _missing_args(missing=['date_1'])
+		return None
 	
 	# If date_2 not specified, simply assume a 1-day range
-	date_2 = request.args.get('date_2', None)
+	date_2 = args.get('date_2', None)
 	if not date_2:
 		date_2 = date_1
 	
 	# If exclude_cancelled is true, exclude 'Cancelled - Normal' from
 	# permitted values for offering_status
-	exclude_cancelled = request.args.get('exclude_cancelled', 'false')
+	exclude_cancelled = args.get('exclude_cancelled', 'false')
 	offering_status = ['Delivered - Normal', 'Open - Normal', 'Open - Normal'] if exclude_cancelled == 'true' else ['Cancelled - Normal', 'Delivered - Normal', 'Open - Normal']
 	
 	# Optional
-	course_code = request.args.get('course_code', '').upper()
-	instructor_name = request.args.get('instructor_name', '')
-	business_line = request.args.get('business_line', '')
-	clients_only = request.args.get('clients_only', 'false')
-	
-	# Run query and return as JSON
-	results = queries.load_offering_counts(date_1, date_2, offering_status, course_code, instructor_name, business_line, clients_only, lang)
-	results_processed = _valid_get(results)
-	return results_processed
+	course_code = args.get('course_code', '').upper()
+	instructor_name = args.get('instructor_name', '')
+	business_line = args.get('business_line', '')
+	clients_only = args.get('clients_only', 'false')
+	return date_1, date_2, offering_status, course_code, instructor_name, business_line, clients_only, lang
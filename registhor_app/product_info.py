@@ -0,0 +1,56 @@
+from registhor_app.config import Config
+from registhor_app.db import query_mysql
+from registhor_app.snapshot import Snapshot
+
+
+class ProductInfo(Snapshot):
+	"""Copy of table 'product_info' shared by all requests in a process, so
+	tombstone routes needn't query the DB. Rows are stored as tuples keyed by
+	upper-cased course code, as MySQL compares them ignoring case, with column
+	names held once. Reloaded only if the table's
+	checksum has changed since the last load.
+	"""
+
+	def course_attr(self, course_attr, course_code):
+		"""Return a column's value for a course code, or None if the course
+		code isn't in the table.
+		"""
+		columns, rows = self.get()
+		row = rows.get(course_code.upper(), None)
+		return None if row is None else row[columns[course_attr]]
+
+	def course_attrs(self, course_code):
+		"""Return {column: value} of a course code's row, or None if the
+		course code isn't in the table.
+		"""
+		columns, rows = self.get()
+		row = rows.get(course_code.upper(), None)
+		return None if row is None else dict(zip(columns, row))
+
+	def stats(self):
+		results = super().stats()
+		if self._data is not None:
+			results['rows'] = len(self._data[1])
+		return results
+
+	def _load(self):
+		results = query_mysql('SELECT * FROM product_info;', dict_=True)
+		columns = {column: i for i, column in enumerate(results[0])} if results else {}
+		rows = {}
+		for my_dict in results:
+			# Keep first row per course code as 'LIMIT 1' does
+			rows.setdefault(my_dict['course_code'].upper(), tuple(my_dict.values()))
+		return columns, rows
+
+	def _source_version(self):
+		# Returns [('registhor.product_info', checksum)]
+		results = query_mysql('CHECKSUM TABLE product_info;')
+		return results[0][1] if results else None
+
+
+product_info = ProductInfo('product_info', Config.PRODUCT_INFO_REFRESH_INTERVAL)
+
+
+def init_app(app):
+	"""In factory function, apply the configured refresh interval."""
+	product_info.refresh_interval = app.config['PRODUCT_INFO_REFRESH_INTERVAL']
@@ -0,0 +1,44 @@
+import threading
+
+
+class QueryTemplate:
+	"""SQL statement whose optional filters are emitted only when the caller
+	supplies a value for them, so MySQL can use indexes on the columns that
+	are actually filtered rather than evaluating '(col = %s OR %s = '')' on
+	every row.
+
+	The template marks where the filters go with '{filters}'; any other
+	named fields (e.g. '{lang}') are filled in from render's keyword args.
+	Rendered SQL is cached per combination of filters present.
+	"""
+
+	def __init__(self, template):
+		self.template = template
+		self._cache = {}
+		self._lock = threading.Lock()
+
+	def render(self, filters, **fields):
+		"""Return (sql, args) where 'filters' is a list of (predicate, value)
+		tuples. A predicate is included, prefixed with AND, only if its value
+		isn't '' or None; its value is bound once per '%s' in the predicate,
+		or, if a tuple, its items are bound to the placeholders in order.
+		'args' holds only the filters' values; callers add any args for
+		placeholders that precede or follow '{filters}'.
+		"""
+		present = tuple(predicate for predicate, value in filters if value not in ('', None))
+		key = (present, tuple(sorted(fields.items())))
+		sql = self._cache.get(key, None)
+		if sql is None:
+			clauses = ''.join('\n\t\tAND {0}'.format(predicate) for predicate in present)
+			sql = self.template.replace('{filters}', clauses).format(**fields)
+			with self._lock:
+				self._cache[key] = sql
+		args = []
+		for predicate, value in filters:
+			if value in ('', None):
+				continue
+			if isinstance(value, tuple):
+				args.extend(value)
+			else:
+				args.extend([value] * predicate.count('%s'))
+		return sql, tuple(args)
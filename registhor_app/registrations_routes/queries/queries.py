@@ -1,10 +1,14 @@
 import re
+from flask import current_app
+from registhor_app.cache import cached
+from registhor_app.clustering import cluster_markers
 from registhor_app.db import query_mysql
-from registhor_app.utils import (_combine_overlapping_cities_hashed,
-	_dict_decimal_to_float, _dict_remove_none)
+from registhor_app.rollups import training_location_rollup
+from registhor_app.utils import _dict_decimal_to_float, _dict_remove_none
 from registhor_app.registrations_routes.utils import fields
 
 
+@cached()
 def load_course_codes(lang):
 	"""Query list of all course codes and their titles as seen
 	in the LSR.
@@ -26,6 +30,7 @@ def load_course_codes(lang):
 	return results_processed
 
 
+@cached()
 def load_department_codes(lang):
 	"""Query list of all department codes and their names as seen
 	in the LSR.
@@ -42,14 +47,17 @@ def load_department_codes(lang):
 	return results_processed
 
 
-def load_training_locations(lang, department_code):
+def load_training_locations(lang, department_code, zoom=None):
 	"""Query names and counts of cities in which a department's learners
 	took training.
 	"""
+	# Serve precomputed markers from in-memory rollup
+	if current_app.config['ROLLUPS_ENABLED']:
+		return training_location_rollup.training_locations(department_code, lang, zoom)
+	
 	field_name = 'offering_city_{0}'.format(lang)
 	# GROUP BY city name as well as latitude and longitude in case cities in
 	# different provinces share same name
-	# ORDER BY COUNT() DESC so that the largest cities appear and are logged first in func '_combine_overlapping_cities_hashed'
 	query = """
 		SELECT {0} AS offering_city, offering_lat, offering_lng, COUNT(reg_id) AS count
 		FROM lsr_this_year
@@ -57,17 +65,49 @@ def load_training_locations(lang, department_code):
 			billing_dept_code = %s
 		AND
 			reg_status = 'Confirmed'
-		GROUP BY 1, 2, 3
-		ORDER BY 4 DESC;
+		GROUP BY 1, 2, 3;
 	""".format(field_name)
 	results = query_mysql(query, (department_code,), dict_=True)
+	return _process_locations(results, zoom)
+
+
+def load_training_locations_batch(lang, department_codes, zoom=None):
+	"""Return {department_code: city markers as 'load_training_locations'}
+	for many departments from a single grouped query.
+	"""
+	if current_app.config['ROLLUPS_ENABLED']:
+		return {department_code: training_location_rollup.training_locations(department_code, lang, zoom)
+				for department_code in department_codes}
 	
+	field_name = 'offering_city_{0}'.format(lang)
+	query = """
+		SELECT billing_dept_code, {0} AS offering_city, offering_lat, offering_lng, COUNT(reg_id) AS count
+		FROM lsr_this_year
+		WHERE
+			billing_dept_code IN ({1})
+		AND
+			reg_status = 'Confirmed'
+		GROUP BY 1, 2, 3, 4;
+	""".format(field_name, ', '.join(['%s'] * len(department_codes)))
+	results = query_mysql(query, tuple(department_codes), dict_=True)
+	
+	# Split rows by department; codes compared ignoring case as MySQL does
+	by_department = {department_code: [] for department_code in department_codes}
+	for my_dict in results:
+		department_results = by_department.get(my_dict.pop('billing_dept_code').upper(), None)
+		if department_results is not None:
+			department_results.append(my_dict)
+	return {department_code: _process_locations(results, zoom) for department_code, results in by_department.items()}
+
+
+def _process_locations(results, zoom):
+	"""Prepare city counts for JSON and combine nearby cities."""
 	# Cast any values of dtype 'Decimal' to float so can be JSONified
 	results_processed = [_dict_decimal_to_float(my_dict) for my_dict in results]
 	# Replace 'None' with empty string for consistency
 	results_processed = [_dict_remove_none(my_dict) for my_dict in results]
 	# Combine nearby cities to avoid clogging map e.g. Kanata, Vanier -> Ottawa
-	results_processed = _combine_overlapping_cities_hashed(results_processed)
+	results_processed = cluster_markers(results_processed, zoom)
 	return results_processed
 
 
@@ -1,6 +1,8 @@
 from flask import Blueprint, request
+from registhor_app.clustering import parse_zoom
 from registhor_app.registrations_routes.queries import queries
-from registhor_app.utils import check_api_key, _missing_args, _valid_get
+from registhor_app.registrations_routes.utils import fields
+from registhor_app.utils import check_api_key, http_cache, _invalid_args, _missing_args, _valid_get
 
 # Instantiate blueprint
 registrations = Blueprint('registrations', __name__)
@@ -8,6 +10,7 @@ registrations = Blueprint('registrations', __name__)
 
 @registrations.route('/api/v1/registrations/course-codes', methods=['GET'])
 @check_api_key
+@http_cache()
 def course_codes():
 	# Only allow 'en' and 'fr' to be passed to app
 	lang = 'fr' if request.args.get('lang', None) == 'fr' else 'en'
@@ -20,6 +23,7 @@ def course_codes():
 
 @registrations.route('/api/v1/registrations/department-codes', methods=['GET'])
 @check_api_key
+@http_cache()
 def department_codes():
 	# Only allow 'en' and 'fr' to be passed to app
 	lang = 'fr' if request.args.get('lang', None) == 'fr' else 'en'
@@ -32,6 +36,7 @@ def department_codes():
 
 @registrations.route('/api/v1/registrations/training-locations', methods=['GET'])
 @check_api_key
+@http_cache()
 def training_locations():
 	# Only allow 'en' and 'fr' to be passed to app
 	lang = 'fr' if request.args.get('lang', None) == 'fr' else 'en'
@@ -42,7 +47,42 @@ def training_locations():
 	if not department_code:
 		return _missing_args(missing=['department_code'])
 	
+	# Map zoom level determines how far apart markers must be to not be combined
+	try:
+		zoom = parse_zoom(request.args.get('zoom', None))
+	except ValueError as e:
+		return _invalid_args(str(e))
+	
 	# Run query and return as JSON
-	results = queries.load_training_locations(lang, department_code)
+	results = queries.load_training_locations(lang, department_code, zoom)
+	results_processed = _valid_get(results)
+	return results_processed
+
+
+@registrations.route('/api/v1/registrations/training-locations/batch', methods=['GET'])
+@check_api_key
+@http_cache()
+def training_locations_batch():
+	"""Return city markers of many departments, keyed by department code."""
+	# Only allow 'en' and 'fr' to be passed to app
+	lang = 'fr' if request.args.get('lang', None) == 'fr' else 'en'
+	
+	# Comma-separated list e.g. department_codes=CES,DND
+	department_codes = [code.strip().upper() for code in request.args.get('department_codes', '').split(',') if code.strip()]
+	
+	if not department_codes:
+		return _missing_args(missing=['department_codes'])
+	if len(department_codes) > fields.MAX_BATCH_SIZE:
+		return _invalid_args('Too many department_codes; maximum is {0}.'.format(fields.MAX_BATCH_SIZE))
+	
+	# Map zoom level determines how far apart markers must be to not be combined
+	try:
+		zoom = parse_zoom(request.args.get('zoom', None))
+	except ValueError as e:
+		return _invalid_args(str(e))
+	
+	# Remove duplicates but keep order
+	department_codes = list(dict.fromkeys(department_codes))
+	results = queries.load_training_locations_batch(lang, department_codes, zoom)
 	results_processed = _valid_get(results)
 	return results_processed
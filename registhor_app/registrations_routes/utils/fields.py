@@ -14,3 +14,6 @@ JUNK_DEPT_CODES = {
 	'_OBSOLETE_AUTRE',
 	'_OBSOLETE_OTHER'
 }
+
+# Most department codes accepted by the batch route in a single request
+MAX_BATCH_SIZE = 500
@@ -0,0 +1,261 @@
+import datetime
+import decimal
+from collections import defaultdict
+from functools import lru_cache
+from registhor_app.clustering import cluster_markers
+from registhor_app.config import Config
+from registhor_app.db import query_mysql
+from registhor_app.interval_index import IntervalIndex
+from registhor_app.snapshot import Snapshot
+
+
+class OfferingCityRollup(Snapshot):
+	"""Offering counts grouped by dates, status, course, business line, client
+	and city, sorted and indexed by date. Serves 'counts-by-city' without a GROUP BY
+	over 'offerings' per request.
+	"""
+
+	def counts_by_city(self, date_1, date_2, offering_status, course_code, business_line, clients_only, lang, zoom=None):
+		"""Return city markers, clustered for zoom level, for offerings
+		overlapping [date_1, date_2] that match the filters. Raise ValueError
+		if a date is malformed.
+		"""
+		date_1 = datetime.date.fromisoformat(date_1)
+		date_2 = datetime.date.fromisoformat(date_2)
+		# Results depend only on args and data so are memoized
+		markers = _offering_counts_by_city(self.get(), date_1, date_2, tuple(offering_status),
+										   course_code, business_line, clients_only, lang, zoom)
+		return [dict(my_dict) for my_dict in markers]
+
+	def stats(self):
+		results = super().stats()
+		if self._data is not None:
+			results['rows'] = len(self._data.rows)
+		return results
+
+	def _load(self):
+		query = """
+			SELECT a.start_date, a.end_date, a.offering_status, a.course_code, c.business_line_en, c.business_line_fr,
+				a.client, a.offering_city_en, a.offering_city_fr, a.offering_lat, a.offering_lng, COUNT(a.offering_id)
+			FROM offerings AS a
+			LEFT OUTER JOIN product_info AS c
+			ON a.course_code = c.course_code
+			GROUP BY 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11
+			ORDER BY 1 ASC;
+		"""
+		results = query_mysql(query)
+		rows = [(start_date, end_date, offering_status, course_code, business_line_en or '', business_line_fr or '',
+				 client or '', city_en or '', city_fr or '', _coord(lat), _coord(lng), count)
+				for (start_date, end_date, offering_status, course_code, business_line_en, business_line_fr,
+					 client, city_en, city_fr, lat, lng, count) in results
+				# Offerings without dates can never overlap a date range
+				if start_date is not None and end_date is not None]
+		return _OfferingRollupData(rows)
+
+	def _on_reload(self):
+		# Drop results memoized from previous data
+		_offering_counts_by_city.cache_clear()
+
+
+class _OfferingRollupData:
+	"""Rows of 'OfferingCityRollup'. Hashed by identity so that memoized
+	results are keyed on the data they were computed from.
+	"""
+	__slots__ = ('index', 'rows')
+
+	def __init__(self, rows):
+		self.rows = rows
+		self.index = IntervalIndex([row[0] for row in rows], [row[1] for row in rows])
+
+
+@lru_cache(maxsize=256)
+def _offering_counts_by_city(data, date_1, date_2, offering_status, course_code, business_line, clients_only, lang, zoom):
+	"""Aggregate rollup rows matching filters into clustered city markers."""
+	rows = data.rows
+	city_index, business_line_index = (7, 4) if lang == 'en' else (8, 5)
+	counts = defaultdict(int)
+	for position in data.index.overlapping(date_1, date_2):
+		row = rows[position]
+		if row[2] not in offering_status:
+			continue
+		if course_code and row[3] != course_code:
+			continue
+		if business_line and row[business_line_index] != business_line:
+			continue
+		if clients_only == 'true' and not row[6]:
+			continue
+		counts[(row[city_index], row[9], row[10])] += row[11]
+	return tuple(cluster_markers(_make_markers(counts), zoom))
+
+
+class TrainingLocationRollup(Snapshot):
+	"""City markers of confirmed registrations this fiscal year for every
+	department in both languages.
+	"""
+
+	def training_locations(self, department_code, lang, zoom=None):
+		"""Return department's city markers clustered for zoom level."""
+		markers = _training_locations(self.get(), department_code, lang, zoom)
+		return [dict(my_dict) for my_dict in markers]
+
+	def stats(self):
+		results = super().stats()
+		if self._data is not None:
+			results['departments'] = len(self._data) // 2
+		return results
+
+	def _load(self):
+		query = """
+			SELECT billing_dept_code, offering_city_en, offering_city_fr, offering_lat, offering_lng, COUNT(reg_id)
+			FROM lsr_this_year
+			WHERE reg_status = 'Confirmed'
+			GROUP BY 1, 2, 3, 4, 5;
+		"""
+		results = query_mysql(query)
+		counts = {'en': defaultdict(lambda: defaultdict(int)), 'fr': defaultdict(lambda: defaultdict(int))}
+		for department_code, city_en, city_fr, lat, lng, count in results:
+			lat, lng = _coord(lat), _coord(lng)
+			counts['en'][department_code][(city_en or '', lat, lng)] += count
+			counts['fr'][department_code][(city_fr or '', lat, lng)] += count
+		return _TrainingLocationData({(department_code, lang): _make_markers(city_counts)
+									  for lang, by_department in counts.items()
+									  for department_code, city_counts in by_department.items()})
+
+	def _on_reload(self):
+		# Drop results memoized from previous data
+		_training_locations.cache_clear()
+
+
+class _TrainingLocationData(dict):
+	"""Unclustered markers of 'TrainingLocationRollup' keyed by department
+	and lang. Hashed by identity so that memoized results are keyed on the
+	data they were computed from.
+	"""
+	__hash__ = object.__hash__
+
+
+@lru_cache(maxsize=1024)
+def _training_locations(data, department_code, lang, zoom):
+	"""Cluster a department's markers for zoom level."""
+	return tuple(cluster_markers(data.get((department_code, lang), ()), zoom))
+
+
+class CommentCountRollup(Snapshot):
+	"""Comment counts by stars per question, department, course and fiscal
+	year, and the course codes commented on, pre-aggregated over every
+	combination of the optional filters so the 'counts' and 'course-codes'
+	comment routes are key lookups. Each refresh folds in only comments with
+	a higher 'survey_id' than any seen; 'invalidate' (e.g. after the nightly
+	load) rebuilds from scratch so edited or deleted comments are caught.
+	"""
+
+	def __init__(self, name, refresh_interval):
+		super().__init__(name, refresh_interval)
+		self._rebuild = True
+
+	def counts(self, short_question, course_code, fiscal_year, department_code):
+		"""Return {stars: count} for stars 1 through 5."""
+		key = (short_question, department_code.upper(), course_code.upper(), fiscal_year)
+		counts = self.get().counts.get(key, {})
+		return {star: counts.get(star, 0) for star in range(1, 6)}
+
+	def course_codes(self, short_question, fiscal_year, department_code):
+		"""Return sorted course codes with comments matching criteria."""
+		key = (short_question, department_code.upper(), fiscal_year)
+		return list(self.get().course_codes.get(key, ()))
+
+	def invalidate(self):
+		"""Force a full rebuild on next lookup."""
+		self._rebuild = True
+		super().invalidate()
+
+	def stats(self):
+		results = super().stats()
+		if self._data is not None:
+			results['keys'] = len(self._data.counts)
+		return results
+
+	def _load(self):
+		previous = None if self._rebuild else self._data
+		self._rebuild = False
+		after = previous.max_survey_id if previous is not None else None
+		query = """
+			SELECT short_question, learner_dept_code, course_code, fiscal_year, stars, COUNT(survey_id), MAX(survey_id)
+			FROM comments{0}
+			GROUP BY 1, 2, 3, 4, 5;
+		""".format(' WHERE survey_id > %s' if after is not None else '')
+		try:
+			results = query_mysql(query, (after,) if after is not None else None)
+		except Exception:
+			# Rebuild next time if this was meant to
+			self._rebuild = self._rebuild or previous is None
+			raise
+		if previous is not None and not results:
+			return previous
+
+		# Add each group to its own key and to keys where course and/or year
+		# are '' i.e. not filtered on
+		new_counts = defaultdict(lambda: defaultdict(int))
+		new_course_codes = defaultdict(set)
+		for short_question, department_code, course_code, fiscal_year, stars, count, max_survey_id in results:
+			department_code = (department_code or '').upper()
+			fiscal_years = {fiscal_year or '', ''}
+			if stars is not None:
+				for course_key in {(course_code or '').upper(), ''}:
+					for fiscal_year_key in fiscal_years:
+						new_counts[(short_question, department_code, course_key, fiscal_year_key)][int(stars)] += count
+			if course_code:
+				for fiscal_year_key in fiscal_years:
+					new_course_codes[(short_question, department_code, fiscal_year_key)].add(course_code)
+			after = max_survey_id if after is None else max(after, max_survey_id)
+
+		# Copy rather than update previous data, which requests may be reading
+		counts = dict(previous.counts) if previous is not None else {}
+		for key, stars in new_counts.items():
+			merged = dict(counts.get(key, {}))
+			for star, count in stars.items():
+				merged[star] = merged.get(star, 0) + count
+			counts[key] = merged
+		course_codes = dict(previous.course_codes) if previous is not None else {}
+		for key, codes in new_course_codes.items():
+			course_codes[key] = tuple(sorted(codes.union(course_codes.get(key, ()))))
+		return _CommentCountData(counts, course_codes, after)
+
+
+class _CommentCountData:
+	"""Lookups of 'CommentCountRollup'."""
+	__slots__ = ('counts', 'course_codes', 'max_survey_id')
+
+	def __init__(self, counts, course_codes, max_survey_id):
+		# Maps (short_question, department_code, course_code, fiscal_year) -> {stars: count}
+		self.counts = counts
+		# Maps (short_question, department_code, fiscal_year) -> sorted course codes
+		self.course_codes = course_codes
+		self.max_survey_id = max_survey_id
+
+
+def _coord(val):
+	"""Cast latitude or longitude as '_dict_decimal_to_float' and
+	'_dict_remove_none' would.
+	"""
+	if val is None:
+		return ''
+	return float(val) if isinstance(val, decimal.Decimal) else val
+
+
+def _make_markers(counts):
+	"""Turn {(city, lat, lng): count} into marker dicts."""
+	return tuple({'offering_city': city, 'offering_lat': lat, 'offering_lng': lng, 'count': count}
+				 for (city, lat, lng), count in counts.items())
+
+
+offering_city_rollup = OfferingCityRollup('offering_city_rollup', Config.ROLLUP_REFRESH_INTERVAL)
+training_location_rollup = TrainingLocationRollup('training_location_rollup', Config.ROLLUP_REFRESH_INTERVAL)
+comment_count_rollup = CommentCountRollup('comment_count_rollup', Config.ROLLUP_REFRESH_INTERVAL)
+
+
+def init_app(app):
+	"""In factory function, apply the configured refresh interval."""
+	offering_city_rollup.refresh_interval = app.config['ROLLUP_REFRESH_INTERVAL']
+	training_location_rollup.refresh_interval = app.config['ROLLUP_REFRESH_INTERVAL']
+	comment_count_rollup.refresh_interval = app.config['ROLLUP_REFRESH_INTERVAL']
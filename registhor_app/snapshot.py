@@ -0,0 +1,106 @@
+import abc
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Every snapshot created in this process, for invalidation and monitoring
+_snapshots = []
+
+
+class Snapshot(abc.ABC):
+	"""Data loaded from the DB and shared by all requests in a process,
+	reloaded once older than 'refresh_interval' seconds. Subclasses implement
+	'_load' to query and build the data; readers call 'get' and use the object
+	it returns, which is swapped whole on reload so is never seen partially
+	built. 'version' is incremented on every reload.
+
+	Subclasses may also implement '_source_version' to return a token that
+	changes whenever the underlying table does, e.g. a checksum; once stale,
+	the data is then only reloaded if the token has changed.
+
+	If a reload fails once data has been loaded, the error is logged and the
+	previous data kept for another 'refresh_interval' before retrying.
+	"""
+
+	def __init__(self, name, refresh_interval):
+		self.name = name
+		self.refresh_interval = refresh_interval
+		self.version = 0
+		self.loaded_at = None
+		self._data = None
+		self._source_token = None
+		self._lock = threading.Lock()
+		_snapshots.append(self)
+
+	def get(self):
+		"""Return current data, reloading first if stale."""
+		self._refresh_if_stale()
+		return self._data
+
+	def invalidate(self):
+		"""Force a reload on next lookup."""
+		self._source_token = None
+		self.loaded_at = None
+
+	def stats(self):
+		return {
+			'version': self.version,
+			'age': round(time.monotonic() - self.loaded_at, 3) if self.loaded_at is not None else None
+		}
+
+	@abc.abstractmethod
+	def _load(self):
+		"""Query and return the new data; called holding the reload lock."""
+
+	def _source_version(self):
+		return None
+
+	def _on_reload(self):
+		"""Called after new data is swapped in e.g. to clear memoized results."""
+
+	def _is_fresh(self):
+		return self.loaded_at is not None and time.monotonic() - self.loaded_at < self.refresh_interval
+
+	def _refresh_if_stale(self):
+		if self._is_fresh():
+			return
+		# If another thread is already reloading, keep serving the previous
+		# data rather than queueing up behind it; block only on first load
+		if not self._lock.acquire(blocking=self._data is None):
+			return
+		try:
+			if self._is_fresh():
+				return
+			try:
+				# Read token before loading so changes made mid-load are caught next time
+				token = self._source_version()
+				if token is not None and token == self._source_token and self._data is not None:
+					self.loaded_at = time.monotonic()
+					return
+				data = self._load()
+			except Exception:
+				if self._data is None:
+					raise
+				logger.exception('Reloading snapshot %s failed; keeping previous data', self.name)
+				self.loaded_at = time.monotonic()
+				return
+			self._data = data
+			self._source_token = token
+			self.version += 1
+			self.loaded_at = time.monotonic()
+			self._on_reload()
+		finally:
+			self._lock.release()
+
+
+def invalidate_all():
+	"""Force every snapshot to reload e.g. after the nightly data load."""
+	for snapshot in _snapshots:
+		snapshot.invalidate()
+
+
+def snapshot_stats():
+	"""Return version and age of every snapshot for monitoring."""
+	return {snapshot.name: snapshot.stats() for snapshot in _snapshots}
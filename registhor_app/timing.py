@@ -0,0 +1,210 @@
+import bisect
+import contextvars
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import g, has_request_context, request
+from registhor_app.config import Config
+
+# Upper bounds, in seconds, of Prometheus histogram buckets
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+slow_query_logger = logging.getLogger('registhor_app.slow_queries')
+
+_enabled = Config.TIMING_ENABLED
+# Seconds; queries taking at least this long are logged
+_slow_query_threshold = Config.SLOW_QUERY_THRESHOLD / 1000
+# Stages of the current request when served outside a Flask request
+# context, i.e. by the ASGI entry point's async handlers
+_task_spans = contextvars.ContextVar('spans', default=None)
+
+
+class Histogram:
+	"""Thread-safe Prometheus-style histogram of durations keyed by a tuple
+	of label values.
+	"""
+
+	def __init__(self, name, help_, label_names):
+		self.name = name
+		self.help = help_
+		self.label_names = label_names
+		# Maps label values -> [bucket counts, sum, count]
+		self._series = {}
+		self._lock = threading.Lock()
+
+	def observe(self, label_values, value):
+		i = bisect.bisect_left(BUCKETS, value)
+		with self._lock:
+			series = self._series.get(label_values, None)
+			if series is None:
+				series = self._series[label_values] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+			series[0][i] += 1
+			series[1] += value
+			series[2] += 1
+
+	def expose(self):
+		"""Return lines of Prometheus text exposition format."""
+		lines = ['# HELP {0} {1}'.format(self.name, self.help), '# TYPE {0} histogram'.format(self.name)]
+		with self._lock:
+			series = sorted((labels, (list(buckets), total, count)) for labels, (buckets, total, count) in self._series.items())
+		for label_values, (buckets, total, count) in series:
+			labels = _format_labels(self.label_names, label_values)
+			cumulative = 0
+			for bound, n in zip(BUCKETS + ('+Inf',), buckets):
+				cumulative += n
+				lines.append('{0}_bucket{{{1},le="{2}"}} {3}'.format(self.name, labels, bound, cumulative))
+			lines.append('{0}_sum{{{1}}} {2}'.format(self.name, labels, round(total, 6)))
+			lines.append('{0}_count{{{1}}} {2}'.format(self.name, labels, count))
+		return lines
+
+
+class Counter:
+	"""Thread-safe Prometheus-style counter keyed by a tuple of label values."""
+
+	def __init__(self, name, help_, label_names):
+		self.name = name
+		self.help = help_
+		self.label_names = label_names
+		self._series = {}
+		self._lock = threading.Lock()
+
+	def inc(self, label_values):
+		with self._lock:
+			self._series[label_values] = self._series.get(label_values, 0) + 1
+
+	def expose(self):
+		"""Return lines of Prometheus text exposition format."""
+		lines = ['# HELP {0} {1}'.format(self.name, self.help), '# TYPE {0} counter'.format(self.name)]
+		with self._lock:
+			series = sorted(self._series.items())
+		for label_values, count in series:
+			labels = _format_labels(self.label_names, label_values)
+			lines.append('{0}{{{1}}} {2}'.format(self.name, labels, count))
+		return lines
+
+
+request_duration = Histogram('registhor_request_duration_seconds', 'Time to handle a request, excluding streamed bodies.',
+							 ('endpoint', 'method', 'status'))
+span_duration = Histogram('registhor_span_duration_seconds', 'Time spent in each stage of handling requests.',
+						  ('span',))
+slow_queries = Counter('registhor_slow_queries_total', 'Queries taking at least SLOW_QUERY_THRESHOLD ms.',
+					   ('template',))
+
+
+@contextmanager
+def span(name):
+	"""Time the enclosed block as stage 'name' (e.g. 'execute') of the
+	current request. Durations of repeated stages are summed.
+	"""
+	if not _enabled:
+		yield
+		return
+	start = time.perf_counter()
+	try:
+		yield
+	finally:
+		elapsed = time.perf_counter() - start
+		span_duration.observe((name,), elapsed)
+		spans = g.setdefault('spans', {}) if has_request_context() else _task_spans.get()
+		if spans is not None:
+			spans[name] = spans.get(name, 0.0) + elapsed
+
+
+def timed(name):
+	"""Decorator timing every call of a function as stage 'name'."""
+	def decorator(f):
+		@wraps(f)
+		def decorated(*args, **kwargs):
+			with span(name):
+				return f(*args, **kwargs)
+		return decorated
+	return decorator
+
+
+def log_slow_query(query, args, elapsed):
+	"""Log and count query if it took at least SLOW_QUERY_THRESHOLD. Only
+	the types of bound parameters are logged, never their values.
+	"""
+	if not _enabled or elapsed < _slow_query_threshold:
+		return
+	template = _normalize_sql(query)
+	slow_queries.inc((template[:80],))
+	slow_query_logger.warning('Slow query (%.1f ms) %s args=%s endpoint=%s', elapsed * 1000, template, _args_shape(args),
+							  request.endpoint if has_request_context() else None)
+
+
+def _format_labels(label_names, label_values):
+	"""Return 'name="value",...' with values escaped for Prometheus."""
+	return ','.join('{0}="{1}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+					for name, value in zip(label_names, label_values))
+
+
+def _normalize_sql(query):
+	"""Collapse whitespace so a template is logged on one line."""
+	return re.sub(r'\s+', ' ', query).strip()
+
+
+def _args_shape(args):
+	"""Describe bound parameters by type and count e.g. '(str, str, int x3)'."""
+	if not args:
+		return '()'
+	shape = []
+	for arg in args:
+		name = type(arg).__name__
+		if shape and shape[-1][0] == name:
+			shape[-1][1] += 1
+		else:
+			shape.append([name, 1])
+	return '({0})'.format(', '.join(name if n == 1 else '{0} x{1}'.format(name, n) for name, n in shape))
+
+
+def metrics_text():
+	"""Return this worker's metrics in Prometheus text exposition format."""
+	lines = []
+	for metric in (request_duration, span_duration, slow_queries):
+		lines.extend(metric.expose())
+	return '\n'.join(lines) + '\n'
+
+
+def _start_timer():
+	g.request_start = time.perf_counter()
+
+
+def _add_server_timing(response):
+	"""Record request duration and send stages as a Server-Timing header."""
+	start = g.get('request_start', None)
+	if start is None:
+		return response
+	elapsed = time.perf_counter() - start
+	request_duration.observe((request.endpoint or 'none', request.method, str(response.status_code)), elapsed)
+	response.headers['Server-Timing'] = server_timing(g.get('spans', {}), elapsed)
+	return response
+
+
+def start_task_spans():
+	"""Collect stages timed in the current asyncio task, for requests
+	served without a Flask request context. Returns the dict filled.
+	"""
+	spans = {}
+	_task_spans.set(spans)
+	return spans
+
+
+def server_timing(spans, elapsed):
+	"""Return a Server-Timing header value of stage and total durations."""
+	timings = ['{0};dur={1:.2f}'.format(name, spans[name] * 1000) for name in spans]
+	timings.append('total;dur={0:.2f}'.format(elapsed * 1000))
+	return ', '.join(timings)
+
+
+def init_app(app):
+	"""In factory function, apply config and register request timing."""
+	global _enabled, _slow_query_threshold
+	_enabled = app.config['TIMING_ENABLED']
+	_slow_query_threshold = app.config['SLOW_QUERY_THRESHOLD'] / 1000
+	if _enabled:
+		app.before_request(_start_timer)
+		app.after_request(_add_server_timing)
@@ -1,8 +1,14 @@
+from flask import current_app
 from registhor_app.db import query_mysql
+from registhor_app.product_info import product_info
 
 
 def load_attr(course_attr, course_code):
 	"""Return tombstone information for a given course code."""
+	# Serve from in-memory copy of table
+	if current_app.config['PRODUCT_INFO_SNAPSHOT_ENABLED']:
+		return product_info.course_attr(course_attr, course_code) or ''
+	
 	query = """
 		SELECT {0}
 		FROM product_info
@@ -18,6 +24,10 @@ def load_attr(course_attr, course_code):
 
 def load_all_attrs(course_code):
 	"""Return all tombstone information for a given course code."""
+	# Serve from in-memory copy of table
+	if current_app.config['PRODUCT_INFO_SNAPSHOT_ENABLED']:
+		return product_info.course_attrs(course_code) or {}
+	
 	query = """
 		SELECT *
 		FROM product_info
@@ -25,4 +35,37 @@ def load_all_attrs(course_code):
 		LIMIT 1;
 	"""
 	results = query_mysql(query, (course_code,), dict_=True)
-	return results[0]
+	return results[0] if results else {}
+
+
+def load_attrs_batch(course_attrs, course_codes):
+	"""Return {course_code: {route_attr: value}} for many course codes in a
+	single query, where course_attrs maps route names to names in DB. Course
+	codes not in product_info are omitted.
+	"""
+	# Serve from in-memory copy of table
+	if current_app.config['PRODUCT_INFO_SNAPSHOT_ENABLED']:
+		my_dict = {}
+		for course_code in course_codes:
+			values = product_info.course_attrs(course_code)
+			if values is not None:
+				my_dict[course_code] = {route_attr: values[course_attr] or '' for route_attr, course_attr in course_attrs.items()}
+		return my_dict
+	
+	# Aliases e.g. 'duration' and 'duree' share a column so select it once
+	columns = sorted(set(course_attrs.values()))
+	query = """
+		SELECT course_code, {0}
+		FROM product_info
+		WHERE course_code IN ({1});
+	""".format(', '.join(columns), ', '.join(['%s'] * len(course_codes)))
+	results = query_mysql(query, tuple(course_codes))
+	my_dict = {}
+	for row in results:
+		# Keep first row per course code as 'load_attr' does with LIMIT 1
+		if row[0] in my_dict:
+			continue
+		values = dict(zip(columns, row[1:]))
+		# Return '' rather than NULL as 'load_attr' does
+		my_dict[row[0]] = {route_attr: values[course_attr] or '' for route_attr, course_attr in course_attrs.items()}
+	return my_dict
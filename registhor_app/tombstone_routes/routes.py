@@ -1,14 +1,41 @@
 from flask import Blueprint, request
 from registhor_app.tombstone_routes.queries import queries
 from registhor_app.tombstone_routes.utils import fields
-from registhor_app.utils import check_api_key, _invalid_args, _valid_get
+from registhor_app.utils import check_api_key, http_cache, _invalid_args, _missing_args, _valid_get
 
 # Instantiate blueprint
 tombstone = Blueprint('tombstone', __name__)
 
 
+@tombstone.route('/api/v1/tombstone/batch')
+@check_api_key
+@http_cache()
+def get_tombstone_batch(methods=['GET']):
+	"""Return tombstone information for many course codes in one query."""
+	# Comma-separated lists e.g. course_codes=A230,B200&attrs=duration,provider
+	course_codes = [code.strip().upper() for code in request.args.get('course_codes', '').split(',') if code.strip()]
+	course_attrs = [attr.strip() for attr in request.args.get('attrs', '').split(',') if attr.strip()]
+	
+	missing = [arg for arg, val in (('course_codes', course_codes), ('attrs', course_attrs)) if not val]
+	if missing:
+		return _missing_args(missing=missing)
+	if len(course_codes) > fields.MAX_BATCH_SIZE:
+		return _invalid_args('Too many course_codes; maximum is {0}.'.format(fields.MAX_BATCH_SIZE))
+	invalid = [attr for attr in course_attrs if attr not in fields.ATTR_DICT]
+	if invalid:
+		return _invalid_args('Invalid tombstone_value: {0}.'.format(', '.join(invalid)))
+	
+	# Remove duplicates but keep order for a stable ETag
+	course_codes = list(dict.fromkeys(course_codes))
+	course_attrs = {attr: fields.ATTR_DICT[attr] for attr in course_attrs}
+	results = queries.load_attrs_batch(course_attrs, course_codes)
+	results_processed = _valid_get(results)
+	return results_processed
+
+
 @tombstone.route('/api/v1/tombstone/<string:course_code>')
 @check_api_key
+@http_cache()
 def get_all_tombstone(course_code, methods=['GET']):
 	"""Return all tombstone information for a given course code."""
 	course_code = course_code.upper()
@@ -19,6 +46,7 @@ def get_all_tombstone(course_code, methods=['GET']):
 
 @tombstone.route('/api/v1/tombstone/<string:course_code>/<string:course_attr>')
 @check_api_key
+@http_cache()
 def get_tombstone(course_code, course_attr, methods=['GET']):
 	"""Return tombstone information for a given course code."""
 	course_attr_db = fields.ATTR_DICT.get(course_attr, None)
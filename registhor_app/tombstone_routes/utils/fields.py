@@ -27,3 +27,6 @@ ATTR_DICT = {
 	'project-lead': 'project_lead',
 	'chef-de-projet': 'project_lead'
 }
+
+# Most course codes accepted by the batch route in a single request
+MAX_BATCH_SIZE = 500
@@ -1,8 +1,18 @@
+import base64
 import datetime
 import decimal
 import os
+import unicodedata
 from functools import wraps
-from flask import jsonify, request
+from flask import (current_app, jsonify, json, make_response, request, Response,
+	stream_with_context)
+from registhor_app.timing import span, timed
+
+# orjson is optional; used for compact JSON if installed
+try:
+	import orjson
+except ImportError:
+	orjson = None
 
 
 def check_api_key(f):
@@ -18,6 +28,57 @@ def check_api_key(f):
 	return decorated
 
 
+def http_cache(max_age=None):
+	"""Make successful responses cacheable by browsers and proxies: add an
+	ETag (hash of the body; weakened if the response is then compressed) and
+	Cache-Control, and answer 304 Not Modified if the client's copy is
+	current. No Last-Modified is sent as there's no record of when the data
+	changed, so clients revalidate with If-None-Match. Apply beneath
+	'check_api_key' so denied requests aren't cached.
+	"""
+	def decorator(f):
+		@wraps(f)
+		def decorated(*args, **kwargs):
+			response = make_response(f(*args, **kwargs))
+			if response.status_code != 200 or response.is_streamed:
+				return response
+			response.add_etag()
+			response.cache_control.public = True
+			response.cache_control.max_age = max_age if max_age is not None else current_app.config['HTTP_CACHE_MAX_AGE']
+			return response.make_conditional(request)
+		return decorated
+	return decorator
+
+
+def _jsonify(obj):
+	"""As flask.jsonify, but return minified JSON from a faster encoder if
+	passed 'format=compact' or if 'COMPACT_JSON' is set.
+	"""
+	with span('serialize'):
+		if request.args.get('format', None) == 'compact' or current_app.config['COMPACT_JSON']:
+			return Response(_dumps(obj) + '\n', mimetype='application/json')
+		return jsonify(obj)
+
+
+def _dumps(obj):
+	"""Serialize obj to minified JSON, using orjson if available."""
+	if orjson is not None:
+		return orjson.dumps(obj, default=_json_default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+	# Keep key order as 'JSON_SORT_KEYS' does, even outside an app context
+	return json.dumps(obj, default=_json_default, ensure_ascii=False, separators=(',', ':'), sort_keys=False)
+
+
+def _json_default(obj):
+	"""Serialize types not natively handled by JSON encoders: Decimals as
+	floats and dates in ISO format, as '_process_offerings' does.
+	"""
+	if isinstance(obj, decimal.Decimal):
+		return float(obj)
+	if isinstance(obj, (datetime.date, datetime.datetime)):
+		return obj.isoformat()
+	raise TypeError('Object of type {0} is not JSON serializable'.format(type(obj).__name__))
+
+
 def _invalid_key():
 	"""If API key invalid, return error and empty array."""
 	results = {
@@ -25,7 +86,7 @@ def _invalid_key():
 		"results": [],
 		"status": "REQUEST_DENIED"
 	}
-	return jsonify(results), 403
+	return _jsonify(results), 403
 
 
 def _missing_key():
@@ -35,7 +96,7 @@ def _missing_key():
 		"results": [],
 		"status": "REQUEST_DENIED"
 	}
-	return jsonify(results), 403
+	return _jsonify(results), 403
 
 
 def _invalid_args(message):
@@ -45,7 +106,7 @@ def _invalid_args(message):
 		"results": [],
 		"status": "INVALID_REQUEST"
 	}
-	return jsonify(results), 406
+	return _jsonify(results), 406
 
 
 def _missing_args(missing):
@@ -55,7 +116,7 @@ def _missing_args(missing):
 		"results": [],
 		"status": "INVALID_REQUEST"
 	}
-	return jsonify(results), 400
+	return _jsonify(results), 400
 
 
 def _valid_delete():
@@ -63,7 +124,7 @@ def _valid_delete():
 	results_processed = {
 		"status": "OK"
 	}
-	return jsonify(results_processed), 200
+	return _jsonify(results_processed), 200
 
 
 def _valid_get(results):
@@ -72,7 +133,52 @@ def _valid_get(results):
 		"results": results,
 		"status": "OK"
 	}
-	return jsonify(results_processed), 200
+	return _jsonify(results_processed), 200
+
+
+def _valid_get_page(results, next_cursor):
+	"""If keyset-paginated query ran successfully, return results and the
+	cursor for the next page ('null' if this is the last page).
+	"""
+	results_processed = {
+		"results": results,
+		"next_cursor": next_cursor,
+		"status": "OK"
+	}
+	return _jsonify(results_processed), 200
+
+
+def _valid_get_stream(batches, ndjson=False):
+	"""If query ran successfully, stream results. 'batches' is an iterable of
+	lists of rows; each is serialized and sent as soon as it's fetched. Emits
+	the same envelope as '_valid_get' or, if ndjson, one row per line.
+	"""
+	def generate_json():
+		yield '{"results": ['
+		first = True
+		for batch in batches:
+			if not batch:
+				continue
+			chunk = ', '.join(_dumps(row) for row in batch)
+			yield chunk if first else ', ' + chunk
+			first = False
+		yield '], "status": "OK"}\n'
+	
+	def generate_ndjson():
+		for batch in batches:
+			yield ''.join(_dumps(row) + '\n' for row in batch)
+	
+	if ndjson:
+		return Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson'), 200
+	return Response(stream_with_context(generate_json()), mimetype='application/json'), 200
+
+
+def _stream_mode():
+	"""Return requested streaming format ('json' or 'ndjson'), or None if
+	the response should be built in memory as usual.
+	"""
+	stream = request.args.get('stream', '')
+	return stream if stream in ('json', 'ndjson') else None
 
 
 def _valid_post():
@@ -80,7 +186,7 @@ def _valid_post():
 	results_processed = {
 		"status": "OK"
 	}
-	return jsonify(results_processed), 200
+	return _jsonify(results_processed), 200
 
 
 def _invalid_delete():
@@ -88,7 +194,7 @@ def _invalid_delete():
 	results_processed = {
 		"status": "UNPROCESSABLE ENTITY"
 	}
-	return jsonify(results_processed), 422
+	return _jsonify(results_processed), 422
 
 
 def _invalid_get():
@@ -96,7 +202,7 @@ def _invalid_get():
 	results_processed = {
 		"status": "NOT FOUND"
 	}
-	return jsonify(results_processed), 404
+	return _jsonify(results_processed), 404
 
 
 def _invalid_post():
@@ -104,7 +210,7 @@ def _invalid_post():
 	results_processed = {
 		"status": "UNPROCESSABLE ENTITY"
 	}
-	return jsonify(results_processed), 422
+	return _jsonify(results_processed), 422
 
 
 def _dict_decimal_to_float(my_dict):
@@ -128,15 +234,6 @@ def _dict_remove_none(my_dict):
 	return my_dict
 
 
-def _dict_fix_dates(my_dict):
-	"""Convert values of keys 'start_date' and 'end_date' to proper ISO
-	date format."""
-	for key, val in my_dict.items():
-		if key in ['start_date', 'end_date']:
-			my_dict[key] = val.isoformat()
-	return my_dict
-
-
 # If offering has more than n confirmed registrations, it will remain
 # on the books and not be cancelled
 # Current rule-of-thumb is 10; decided by Programs team at Asticou
@@ -148,17 +245,30 @@ COLOR_DICT = {
 	'RED': '#f8d7da'
 }
 
+# French labels for offering fields
+BUSINESS_TYPE_MAP = {
+	'Events': 'Événement',
+	'Instructor-Led': 'Salle de classe'
+}
+OFFERING_LANGUAGE_MAP = {
+	'Bilingual': 'Bilingue',
+	'English': 'Anglais',
+	'French': 'Français'
+}
+OFFERING_STATUS_MAP = {
+	'Cancelled - Normal': 'Annulée',
+	'Delivered - Normal': 'Livrée',
+	'Open - Normal': 'Ouverte'
+}
+
 
-def _assign_background_color(start_date, end_date, confirmed_count, offering_status):
+def _assign_background_color(start_date, end_date, confirmed_count, offering_status, current_date, thirty_days_from_now):
 	"""Assign offerings a background colour given their start date, number of
-	confirmed registrations, and status.
+	confirmed registrations, and status. Reference dates are passed in so
+	they're computed once per result set rather than per offering.
 	"""
 	# Use date, rather than datetime, objects for easy comparison and no issues
 	# with timezones
-	start_date = datetime.datetime.strptime(start_date, '%Y-%m-%d').date()
-	end_date = datetime.datetime.strptime(end_date, '%Y-%m-%d').date()
-	current_date = datetime.date.today()
-	thirty_days_from_now = current_date + datetime.timedelta(days=30)
 	# If offering has been cancelled, red
 	# Place this before date check to properly display past offerings that were cancelled
 	if offering_status == 'Cancelled - Normal':
@@ -173,34 +283,56 @@ def _assign_background_color(start_date, end_date, confirmed_count, offering_sta
 	return COLOR_DICT['ORANGE']
 
 
-def _dict_assign_background_color(my_dict):
-	"""Add background colour to dict."""
-	background_color = _assign_background_color(my_dict['start_date'], my_dict['end_date'], my_dict['confirmed_count'], my_dict['offering_status'])
-	my_dict['background_color'] = background_color
-	return my_dict
+@timed('munge')
+def _process_offerings(my_list, lang):
+	"""Prepare offering dicts for JSON in a single pass over the results:
+	cast Decimals to float, replace None with empty strings, add background
+	colours, convert dates to ISO format and fix French edge cases.
+	"""
+	# Compute date thresholds once rather than per row
+	current_date = datetime.date.today()
+	thirty_days_from_now = current_date + datetime.timedelta(days=30)
+	fr = lang == 'fr'
+	for my_dict in my_list:
+		for key, val in my_dict.items():
+			if val is None:
+				my_dict[key] = ''
+			elif isinstance(val, decimal.Decimal):
+				my_dict[key] = float(val)
+		start_date = my_dict['start_date']
+		end_date = my_dict['end_date']
+		offering_status = my_dict['offering_status']
+		my_dict['background_color'] = _assign_background_color(start_date, end_date, my_dict['confirmed_count'],
+															   offering_status, current_date, thirty_days_from_now)
+		my_dict['start_date'] = start_date.isoformat()
+		my_dict['end_date'] = end_date.isoformat()
+		if fr:
+			my_dict['business_type'] = BUSINESS_TYPE_MAP[my_dict['business_type']]
+			my_dict['offering_language'] = OFFERING_LANGUAGE_MAP[my_dict['offering_language']]
+			my_dict['offering_status'] = OFFERING_STATUS_MAP[offering_status]
+	return my_list
+
+
+def _encode_cursor(values):
+	"""Encode the sort-key values of a page's last row into an opaque,
+	URL-safe cursor for keyset pagination.
+	"""
+	return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
 
 
-def _dict_fix_lang(my_dict, lang):
-	"""Fix French edge cases."""
-	BUSINESS_TYPE_MAP = {
-		'Events': 'Événement',
-		'Instructor-Led': 'Salle de classe'
-	}
-	OFFERING_LANGUAGE_MAP = {
-		'Bilingual': 'Bilingue',
-		'English': 'Anglais',
-		'French': 'Français'
-	}
-	OFFERING_STATUS_MAP = {
-		'Cancelled - Normal': 'Annulée',
-		'Delivered - Normal': 'Livrée',
-		'Open - Normal': 'Ouverte'
-	}
-	if lang == 'fr':
-		my_dict['business_type'] = BUSINESS_TYPE_MAP[my_dict['business_type']]
-		my_dict['offering_language'] = OFFERING_LANGUAGE_MAP[my_dict['offering_language']]
-		my_dict['offering_status'] = OFFERING_STATUS_MAP[my_dict['offering_status']]
-	return my_dict
+def _decode_cursor(cursor, n_values):
+	"""Decode a cursor made by '_encode_cursor'. Return an empty list for the
+	first page and raise ValueError if malformed.
+	"""
+	if not cursor:
+		return []
+	try:
+		values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+	except Exception:
+		raise ValueError('Invalid cursor.')
+	if not isinstance(values, list) or len(values) != n_values:
+		raise ValueError('Invalid cursor.')
+	return values
 
 
 def _unpack_tuples(my_list):
@@ -211,36 +343,7 @@ def _unpack_tuples(my_list):
 	return results_processed
 
 
-def _combine_overlapping_cities_hashed(my_list):
-		"""If two cities' markers overlap, combine them into a single entry.
-		
-		Explanation: Use latitude and longitude rounded to N_DIGITS to create
-		a PKEY for each city. Rounding will cause nearby cities to have the
-		same PKEY.
-		
-		Largest city chosen: As SQL queries make use of 'ORDER BY COUNT() DESC',
-		the largest cities appear and be logged first. This means that e.g. 2
-		occurrences of Kanata will be merged into Ottawa's 30 occurrences.
-		"""
-		N_DIGITS = 1
-		merge_dict = {}
-		for dict_ in my_list:
-			city_name = dict_['offering_city']
-			count = dict_['count']
-			# Python's 'round' internal func uses technique 'round half to even'
-			# https://en.wikipedia.org/wiki/Rounding#Round_half_to_even
-			lat = round(dict_['offering_lat'], N_DIGITS) if dict_['offering_lat'] != '' else ''
-			lng = round(dict_['offering_lng'], N_DIGITS) if dict_['offering_lng'] != '' else ''
-			pkey = str(lat) + str(lng)
-			# If the city lacks lat, lng values (e.g. a webcast), use the city name as its pkey
-			pkey = pkey if pkey != '' else city_name
-			# Log first occurrence
-			if pkey not in merge_dict:
-				# Log non-rounded values for maximum accuracy
-				merge_dict[pkey] = dict_
-			# If lat/lng already logged, combine cities
-			else:
-				merge_dict[pkey]['count'] += count
-		# Return merge_dict's values in list
-		results = [value for value in merge_dict.values()]
-		return results
+def _fold(text):
+	"""Lower-case and strip accents e.g. 'Hélène' -> 'helene'."""
+	decomposed = unicodedata.normalize('NFKD', text)
+	return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()